@@ -1,93 +1,200 @@
 import pygame
 from settings import *
-from math import atan2, degrees 
-from os.path import join 
-import os 
+from timebase import get_ticks
+from assets import asset_manager
+from math import atan2, degrees, hypot
 
-class Sprite(pygame.sprite.Sprite):
-    def __init__(self, pos, surf, groups):
-        super().__init__(groups)
-        self.image = surf
-        self.rect = self.image.get_rect(topleft = pos)
-        self.ground = True
+mask_cache = {}
 
-class CollisionSprite(pygame.sprite.Sprite):
-    def __init__(self, pos, surf, groups):
-        super().__init__(groups)
+def get_mask(surf):
+    mask = mask_cache.get(surf)
+    if mask is None:
+        mask = mask_cache[surf] = pygame.mask.from_surface(surf)
+    return mask
+
+flash_cache = {}
+
+def get_death_flash(surf):
+    flash = flash_cache.get(surf)
+    if flash is None:
+        flash = pygame.mask.from_surface(surf).to_surface()
+        flash.set_colorkey('black')
+        flash_cache[surf] = flash
+    return flash
+
+class RotationCache:
+    def __init__(self, surf, steps):
+        self.surf = surf
+        self.size = surf.get_size()
+        self.steps = steps
+        self.step_angle = 360 / steps
+        self.images = [None] * steps
+
+    def build(self, start = 0, stop = None):
+        for index in range(start, min(stop or self.steps, self.steps)):
+            if self.images[index] is None:
+                self.images[index] = pygame.transform.rotozoom(self.surf, -index * self.step_angle, 1)
+        return self
+
+    def index(self, direction):
+        angle = degrees(atan2(direction.y, direction.x))
+        return round(angle / self.step_angle) % self.steps
+
+rotation_cache = {}
+
+def get_rotations(surf, steps):
+    # One atlas per image. The Preloader renders it in batches behind the
+    # menu; callers finish it with build() before the first frame.
+    key = (surf, steps)
+    rotations = rotation_cache.get(key)
+    if rotations is None:
+        rotations = rotation_cache[key] = RotationCache(surf, steps)
+    return rotations
+
+class SpritePool:
+    def __init__(self, sprite_class):
+        self.sprite_class = sprite_class
+        self.free = []
+
+    def acquire(self, *args):
+        if self.free:
+            sprite = self.free.pop()
+            sprite.spawn(*args)
+            return sprite
+        return self.sprite_class(*args, pool = self)
+
+    def release(self, sprite):
+        self.free.append(sprite)
+
+class PooledSprite(pygame.sprite.Sprite):
+    def __init__(self, pool):
+        super().__init__()
+        self.pool = pool
+
+    def kill(self):
+        was_alive = self.alive()
+        super().kill()
+        if was_alive and self.pool is not None:
+            self.pool.release(self)
+
+class StaticObject:
+    __slots__ = ('image', 'rect')
+
+    def __init__(self, pos, surf):
         self.image = surf
-        self.rect = self.image.get_rect(topleft = pos)
+        self.rect = surf.get_rect(topleft = pos)
+
+class Collider:
+    __slots__ = ('rect',)
+
+    def __init__(self, pos, size):
+        self.rect = pygame.Rect(pos, size)
 
 class Gun(pygame.sprite.Sprite):
+    layer = 'overlay'
+
     def __init__(self, player, groups):
         self.player = player 
         self.distance = 140
         self.player_direction = pygame.Vector2(0,1)
+        self.last_aim = None
 
         super().__init__(groups)
-        self.gun_surf = pygame.image.load(join('One piece', 'images', 'gun', 'gun.png')).convert_alpha()
+        self.gun_surf = asset_manager.image('images', 'gun', 'gun.png')
+        self.rotations = get_rotations(self.gun_surf, GUN_ANGLE_STEPS).build()
         self.image = self.gun_surf
         self.rect = self.image.get_rect(center = self.player.rect.center + self.player_direction * self.distance) 
     
     def get_direction(self):
-        mouse_x, mouse_y = pygame.mouse.get_pos()
-        mouse_pos = pygame.Vector2(mouse_x, mouse_y)
-        
-        player_screen_pos = pygame.Vector2(WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2)
-        
-        self.player_direction = (mouse_pos - player_screen_pos).normalize()
+        mouse_pos = self.player.controls.get_mouse_pos()
+        player_screen_pos = (WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2)
+        if (mouse_pos, player_screen_pos) == self.last_aim:
+            return False
+        self.last_aim = (mouse_pos, player_screen_pos)
+
+        direction = pygame.Vector2(mouse_pos) - pygame.Vector2(player_screen_pos)
+        if direction.magnitude() == 0:
+            return False
+        self.player_direction = direction.normalize()
+        return True
         
     def rotate_gun(self):
-        angle = degrees(atan2(self.player_direction.y, self.player_direction.x)) 
-        self.image = pygame.transform.rotozoom(self.gun_surf, -angle, 1)
+        self.image = self.rotations.images[self.rotations.index(self.player_direction)]
 
     def shoot(self):
         print("shoot")
             
     def update(self, _):
-        self.get_direction()
-        self.rotate_gun() 
+        if self.get_direction():
+            self.rotate_gun() 
         self.rect.center = self.player.rect.center + self.player_direction * self.distance
 
-class Bullet(pygame.sprite.Sprite):
-    def __init__(self, surf, pos, direction, groups):
-        super().__init__(groups)
-        self.image = surf 
-        self.rect = self.image.get_rect(center = pos)
-        self.spawn_time = pygame.time.get_ticks()
-        self.lifetime = 1000
+class Bullet(PooledSprite):
+    layer = 'overlay'
 
-        self.direction = direction.normalize() if direction.magnitude() > 0 else pygame.Vector2(0, -1) 
+    def __init__(self, images, pos, direction, groups, pool = None):
+        super().__init__(pool)
+        self.lifetime = 1000
         self.speed = 1000 
+        self.direction = pygame.Vector2()
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.spawn(images, pos, direction, groups)
 
-        if self.direction.magnitude() > 0:
-            angle = degrees(atan2(self.direction.y, self.direction.x))
-            self.image = pygame.transform.rotozoom(self.image, -angle, 1)
+    def spawn(self, images, pos, direction, groups):
+        self.rect.size = images.size
+        self.rect.center = pos
+        self.previous_center = self.rect.center
+        self.radius = min(images.size) // 2
+        self.spawn_time = get_ticks()
+
+        if direction.magnitude() > 0:
+            self.direction.update(direction)
+            self.direction.normalize_ip()
+        else:
+            self.direction.update(0, -1)
+
+        index = images.index(self.direction)
+        self.image = images.images[index]
+        self.add(groups)
 
     def update(self, dt):
+        self.previous_center = self.rect.center
         self.rect.center += self.direction * self.speed * dt
 
-        if pygame.time.get_ticks() - self.spawn_time >= self.lifetime:
+        if get_ticks() - self.spawn_time >= self.lifetime:
             self.kill() 
 
-class Enemy(pygame.sprite.Sprite):
-    def __init__(self, pos, frames, groups, player, collision_sprites):
-        super().__init__(groups)
+class Enemy(PooledSprite):
+    def __init__(self, pos, frames, groups, player, collision_grid, flow_field = None, enemy_grid = None, pool = None):
+        super().__init__(pool)
+        self.animation_speed = 6
+        self.direction = pygame.Vector2()
+        self.speed = ENEMY_SPEED
+        self.death_duration = 400
+
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.hitbox_rect = pygame.Rect(0, 0, 0, 0)
+        self.spawn(pos, frames, groups, player, collision_grid, flow_field, enemy_grid)
+
+    def spawn(self, pos, frames, groups, player, collision_grid, flow_field = None, enemy_grid = None):
         self.player = player
+        self.collision_grid = collision_grid
+        self.flow_field = flow_field
+        self.enemy_grid = enemy_grid
 
         self.frames = frames
         self.frame_index = 0
-        
         self.image = self.frames[self.frame_index] 
-        self.animation_speed = 6
+        self.mask = get_mask(self.image)
 
-        self.rect = self.image.get_rect(center=pos)
-        self.hitbox_rect = self.rect.inflate(-20,-40)
-        self.collision_sprites = collision_sprites
-        self.direction = pygame.Vector2()
-        self.speed = 300
+        self.rect.size = self.image.get_size()
+        self.rect.center = pos
+        self.hitbox_rect.size = (self.rect.width - 20, self.rect.height - 40)
+        self.hitbox_rect.center = self.rect.center
+        self.direction.update(0, 0)
 
         self.death_time = 0
-        self.death_duration = 400
+        self.add(groups)
 
     def animate(self, dt):
         self.frame_index += self.animation_speed * dt
@@ -95,17 +202,23 @@ class Enemy(pygame.sprite.Sprite):
             self.frame_index = 0
 
         self.image = self.frames[int(self.frame_index)]
+        self.mask = get_mask(self.image)
 
     def move(self, dt):
         player_pos = pygame.Vector2(self.player.rect.center)
         enemy_pos = pygame.Vector2(self.rect.center)
         
         direction_to_player = player_pos - enemy_pos
+        flow = self.flow_field.direction(self.hitbox_rect.center) if self.flow_field else None
 
-        if direction_to_player.magnitude() > 0:
+        if flow is not None:
+            self.direction = pygame.Vector2(flow)
+        elif direction_to_player.magnitude() > 0:
             self.direction = direction_to_player.normalize()
         else:
             self.direction = pygame.Vector2(0, 0)
+        if self.enemy_grid:
+            self.separate()
             
         self.hitbox_rect.x += self.direction.x * self.speed * dt
         self.collision('horizontal')
@@ -113,24 +226,35 @@ class Enemy(pygame.sprite.Sprite):
         self.collision('vertical')
         self.rect.center = self.hitbox_rect.center
 
+    def separate(self):
+        push = pygame.Vector2()
+        for dx, dy in self.enemy_grid.neighbour_offsets(self, SEPARATION_RADIUS):
+            distance = hypot(dx, dy)
+            if distance > 0:
+                weight = (SEPARATION_RADIUS - distance) / (SEPARATION_RADIUS * distance)
+                push.x += dx * weight
+                push.y += dy * weight
+        if push.x or push.y:
+            steering = self.direction + push * SEPARATION_WEIGHT
+            if steering.magnitude() > 0:
+                self.direction = steering.normalize()
+
     def collision(self, direction):
-        for sprite in self.collision_sprites:
-            if sprite.rect.colliderect(self.hitbox_rect):
-                if direction == 'horizontal':
-                    if self.direction.x > 0: self.hitbox_rect.right = sprite.rect.left
-                    if self.direction.x < 0: self.hitbox_rect.left = sprite.rect.right
-                else:
-                    if self.direction.y < 0: self.hitbox_rect.top = sprite.rect.bottom
-                    if self.direction.y > 0: self.hitbox_rect.bottom = sprite.rect.top
+        for sprite in self.collision_grid.colliding(self.hitbox_rect):
+            if direction == 'horizontal':
+                if self.direction.x > 0: self.hitbox_rect.right = sprite.rect.left
+                if self.direction.x < 0: self.hitbox_rect.left = sprite.rect.right
+            else:
+                if self.direction.y < 0: self.hitbox_rect.top = sprite.rect.bottom
+                if self.direction.y > 0: self.hitbox_rect.bottom = sprite.rect.top
 
     def destroy(self):
-        self.death_time = pygame.time.get_ticks()
-        surf = pygame.mask.from_surface(self.frames[0]).to_surface()
-        surf.set_colorkey('black')
-        self.image = surf
+        self.death_time = get_ticks()
+        self.image = get_death_flash(self.frames[0])
+        self.mask = get_mask(self.frames[0])
 
     def death_timer(self):
-        if pygame.time.get_ticks() - self.death_time >= self.death_duration:
+        if get_ticks() - self.death_time >= self.death_duration:
             self.kill()
 
     def update(self, dt):
@@ -0,0 +1,423 @@
+import pygame
+from settings import *
+from os.path import join, dirname, abspath, exists
+from pytmx import TiledMap
+from pytmx.util_pygame import smart_convert, handle_transformation
+from pytmx.pytmx import unpack_gids
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import xml.etree.ElementTree as ElementTree
+import hashlib
+import pickle
+import tempfile
+import time
+import os
+
+BASE_DIR = dirname(abspath(__file__))
+
+class MapData:
+    def __init__(self, width, height, images, ground, objects, collisions, entities):
+        self.width = width
+        self.height = height
+        self.images = images
+        self.ground = ground
+        self.objects = objects
+        self.collisions = collisions
+        self.entities = entities
+
+    def ground_tiles(self):
+        for x, y, image_index in self.ground:
+            yield x, y, self.images[image_index]
+
+    def object_tiles(self):
+        for x, y, image_index in self.objects:
+            yield x, y, self.images[image_index]
+
+    def tiled(self, factor):
+        ground, objects, collisions, entities = [], [], [], []
+        for copy_y in range(factor):
+            for copy_x in range(factor):
+                tile_x, tile_y = copy_x * self.width, copy_y * self.height
+                pixel_x, pixel_y = tile_x * TILE_SIZE, tile_y * TILE_SIZE
+                ground.extend((x + tile_x, y + tile_y, image) for x, y, image in self.ground)
+                objects.extend((x + pixel_x, y + pixel_y, image) for x, y, image in self.objects)
+                collisions.extend((x + pixel_x, y + pixel_y, width, height) for x, y, width, height in self.collisions)
+                entities.extend((name, x + pixel_x, y + pixel_y) for name, x, y in self.entities
+                                if name != 'Player' or (copy_x, copy_y) == (factor // 2, factor // 2))
+        return MapData(self.width * factor, self.height * factor, self.images, ground, objects, collisions, entities)
+
+    def regions(self, size = CHUNK_SIZE):
+        # Buckets the map into size x size tile regions. Objects, colliders and
+        # entities belong to the region that holds their top-left corner;
+        # StreamedLevel keeps that region loaded wherever they reach.
+        pixels = size * TILE_SIZE
+        regions = {}
+        def region(x, y):
+            key = (int(x) // pixels, int(y) // pixels)
+            if key not in regions:
+                regions[key] = MapData(size, size, self.images, [], [], [], [])
+            return regions[key]
+
+        for x, y, image in self.ground:
+            region(x * TILE_SIZE, y * TILE_SIZE).ground.append((x, y, image))
+        for item in self.objects:
+            region(item[0], item[1]).objects.append(item)
+        for item in self.collisions:
+            region(item[0], item[1]).collisions.append(item)
+        for item in self.entities:
+            region(item[1], item[2]).entities.append(item)
+        return regions
+
+class AssetManager:
+    def __init__(self, cache_dir = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.images = {}
+        self.frame_lists = {}
+        self.sounds = {}
+        self.maps = {}
+        self.hashes = {}
+
+    def path(self, *parts):
+        return join(BASE_DIR, *parts)
+
+    def source_hash(self, path):
+        stat = os.stat(path)
+        cached = self.hashes.get(path)
+        if cached and cached[0] == (stat.st_mtime_ns, stat.st_size):
+            return cached[1]
+        with open(path, 'rb') as file:
+            digest = hashlib.sha1(file.read()).hexdigest()
+        self.hashes[path] = ((stat.st_mtime_ns, stat.st_size), digest)
+        return digest
+
+    def cache_path(self, kind, path, params):
+        stat = os.stat(path)
+        key = f'{kind}|{path}|{stat.st_mtime_ns}|{self.source_hash(path)}|{params}'
+        return join(self.cache_dir, hashlib.sha1(key.encode()).hexdigest() + '.cache')
+
+    def read_cache(self, cache_path):
+        if not ASSET_CACHE or not exists(cache_path):
+            return None
+        try:
+            with open(cache_path, 'rb') as file:
+                return pickle.load(file)
+        except (OSError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Warning: Ignoring unreadable asset cache {cache_path}: {e}")
+            return None
+
+    def replace_file(self, path, write):
+        # Writes through a temp file of this process's own and renames it into
+        # place, so concurrent batch workers never share a temp file and
+        # readers only ever see a complete file.
+        os.makedirs(self.cache_dir, exist_ok=True)
+        handle, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                write(file)
+            os.replace(temp_path, path)
+        except BaseException:
+            if exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def write_cache(self, cache_path, data):
+        if not ASSET_CACHE:
+            return
+        try:
+            self.replace_file(cache_path, lambda file: pickle.dump(data, file, pickle.HIGHEST_PROTOCOL))
+        except OSError as e:
+            print(f"Warning: Could not write asset cache {cache_path}: {e}")
+
+    def pack_surface(self, surf):
+        mode = 'RGBA' if surf.get_flags() & pygame.SRCALPHA else 'RGB'
+        return surf.get_size(), mode, pygame.image.tobytes(surf, mode)
+
+    def read_surface(self, packed):
+        size, mode, data = packed
+        return pygame.image.frombytes(data, size, mode)
+
+    def convert_surface(self, surf):
+        return surf.convert_alpha() if surf.get_flags() & pygame.SRCALPHA else surf.convert()
+
+    def unpack_surface(self, packed):
+        return self.convert_surface(self.read_surface(packed))
+
+    # Loading is split into a decode step, which only touches files and can
+    # run on a Preloader worker thread, and a finish step, which converts
+    # surfaces for the display and must run on the main thread.
+    def decode_image(self, parts, scale, size):
+        path = self.path(*parts)
+        if not exists(path):
+            raise FileNotFoundError(path)
+        cache_path = self.cache_path('image', path, (scale, size))
+        packed = self.read_cache(cache_path)
+        if packed:
+            return cache_path, self.read_surface(packed), True
+        return cache_path, pygame.image.load(path), False
+
+    def finish_image(self, key, decoded):
+        if key in self.images:
+            return self.images[key]
+        cache_path, surf, cached = decoded
+        _, scale, size = key
+        if cached:
+            surf = self.convert_surface(surf)
+        else:
+            surf = surf.convert_alpha()
+            if scale:
+                size = (int(surf.get_width() * scale), int(surf.get_height() * scale))
+            if size:
+                surf = pygame.transform.scale(surf, size)
+            self.write_cache(cache_path, self.pack_surface(surf))
+        self.images[key] = surf
+        return surf
+
+    def image(self, *parts, scale = None, size = None):
+        key = (parts, scale, size)
+        if key in self.images:
+            return self.images[key]
+        return self.finish_image(key, self.decode_image(parts, scale, size))
+
+    def frame_files(self, *parts):
+        file_names = [name for name in os.listdir(self.path(*parts)) if name.endswith('.png')]
+        file_names.sort(key=lambda name: int(name.split('.')[0]) if name.split('.')[0].isdigit() else -1)
+        return file_names
+
+    def frames(self, *parts, scale = None):
+        key = (parts, scale)
+        if key in self.frame_lists:
+            return self.frame_lists[key]
+
+        folder = self.path(*parts)
+        frames = []
+        for file_name in self.frame_files(*parts):
+            try:
+                frames.append(self.image(*parts, file_name, scale = scale))
+            except pygame.error as e:
+                print(f"Warning: Could not load image {file_name} from {folder}: {e}")
+
+        self.frame_lists[key] = frames
+        return frames
+
+    def folders(self, *parts):
+        return sorted(name for name in os.listdir(self.path(*parts)) if os.path.isdir(self.path(*parts, name)))
+
+    def decode_sound(self, parts):
+        return pygame.mixer.Sound(self.path(*parts))
+
+    def finish_sound(self, parts, sound):
+        return self.sounds.setdefault(parts, sound)
+
+    def sound(self, *parts):
+        if parts not in self.sounds:
+            self.sounds[parts] = self.decode_sound(parts)
+        return self.sounds[parts]
+
+    def map_dependencies(self, path):
+        dependencies = [path]
+        for tileset in ElementTree.parse(path).getroot().iter('tileset'):
+            source = tileset.get('source')
+            if source:
+                tileset_path = abspath(join(dirname(path), source))
+                dependencies.append(tileset_path)
+                root = ElementTree.parse(tileset_path).getroot()
+            else:
+                tileset_path = path
+                root = tileset
+            for image in root.iter('image'):
+                dependencies.append(abspath(join(dirname(tileset_path), image.get('source'))))
+        return dependencies
+
+    def decode_map(self, parts):
+        path = self.path(*parts)
+        dependencies = {dependency: self.source_hash(dependency) for dependency in self.map_dependencies(path)}
+        cache_path = self.cache_path('map', path, sorted(dependencies.items()))
+        cached = self.read_cache(cache_path)
+        if cached:
+            images = [self.read_surface(packed) for packed in cached['images']]
+            map_data = MapData(cached['width'], cached['height'], images, cached['ground'],
+                               cached['objects'], cached['collisions'], cached['entities'])
+            return cache_path, map_data, None
+        map_data, conversions = self.parse_tmx(path)
+        return cache_path, map_data, conversions
+
+    def finish_map(self, parts, decoded):
+        if parts in self.maps:
+            return self.maps[parts]
+        cache_path, map_data, conversions = decoded
+        if conversions is None:
+            map_data.images = [self.convert_surface(image) for image in map_data.images]
+        else:
+            map_data.images = [smart_convert(image, colorkey, pixelalpha) for image, (colorkey, pixelalpha) in zip(map_data.images, conversions)]
+            self.write_cache(cache_path, {
+                'width': map_data.width,
+                'height': map_data.height,
+                'images': [self.pack_surface(image) for image in map_data.images],
+                'ground': map_data.ground,
+                'objects': map_data.objects,
+                'collisions': map_data.collisions,
+                'entities': map_data.entities,
+            })
+
+        self.maps[parts] = map_data
+        return map_data
+
+    def tmx(self, *parts):
+        if parts in self.maps:
+            return self.maps[parts]
+        return self.finish_map(parts, self.decode_map(parts))
+
+    def flatten_infinite(self, path, root):
+        # pytmx cannot read Tiled's infinite maps, so every layer's chunks are
+        # copied into one dense layer, shifted so the top-left chunk starts at
+        # 0, 0, and the result is written to the cache folder for load_pygame.
+        layers = [(layer, layer.find('data')) for layer in root.iter('layer')]
+        chunks = [chunk for _, data in layers for chunk in data.findall('chunk')]
+        left = min((int(chunk.get('x')) for chunk in chunks), default=0)
+        top = min((int(chunk.get('y')) for chunk in chunks), default=0)
+        width = max((int(chunk.get('x')) + int(chunk.get('width')) for chunk in chunks), default=left) - left
+        height = max((int(chunk.get('y')) + int(chunk.get('height')) for chunk in chunks), default=top) - top
+
+        for layer, data in layers:
+            gids = [0] * (width * height)
+            for chunk in data.findall('chunk'):
+                chunk_x, chunk_y, chunk_width = int(chunk.get('x')) - left, int(chunk.get('y')) - top, int(chunk.get('width'))
+                for index, gid in enumerate(unpack_gids(chunk.text.strip(), data.get('encoding'), data.get('compression'))):
+                    gids[(chunk_y + index // chunk_width) * width + chunk_x + index % chunk_width] = gid
+                data.remove(chunk)
+            data.attrib = {'encoding': 'csv'}
+            data.text = ','.join(map(str, gids))
+            layer.set('width', str(width))
+            layer.set('height', str(height))
+
+        shift_x, shift_y = left * int(root.get('tilewidth')), top * int(root.get('tileheight'))
+        for obj in root.iter('object'):
+            obj.set('x', str(float(obj.get('x', 0)) - shift_x))
+            obj.set('y', str(float(obj.get('y', 0)) - shift_y))
+        for node in list(root.iter('tileset')) + list(root.iter('image')):
+            if node.get('source'):
+                node.set('source', abspath(join(dirname(path), node.get('source'))))
+        root.set('infinite', '0')
+        root.set('width', str(width))
+        root.set('height', str(height))
+
+        flat_path = join(self.cache_dir, hashlib.sha1(path.encode()).hexdigest() + '.tmx')
+        self.replace_file(flat_path, lambda file: ElementTree.ElementTree(root).write(file, encoding='UTF-8', xml_declaration=True))
+        return flat_path
+
+    def parse_tmx(self, path):
+        # Same as pytmx's load_pygame, except that smart_convert is left for
+        # finish_map: it returns the map and each image's conversion settings.
+        root = ElementTree.parse(path).getroot()
+        if root.get('infinite') == '1':
+            path = self.flatten_infinite(path, root)
+
+        conversions = {}
+        def image_loader(filename, colorkey, **kwargs):
+            colorkey = pygame.Color(f'#{colorkey}') if colorkey else None
+            pixelalpha = kwargs.get('pixelalpha', True)
+            sheet = pygame.image.load(filename)
+            def load_image(rect = None, flags = None):
+                tile = sheet.subsurface(rect) if rect else sheet.copy()
+                if flags:
+                    tile = handle_transformation(tile, flags)
+                conversions[tile] = (colorkey, pixelalpha)
+                return tile
+            return load_image
+        tmx_data = TiledMap(path, image_loader = image_loader)
+
+        images = []
+        image_indices = {}
+        def image_index(image):
+            if id(image) not in image_indices:
+                image_indices[id(image)] = len(images)
+                images.append(image)
+            return image_indices[id(image)]
+
+        ground = [(x, y, image_index(image)) for x, y, image in tmx_data.get_layer_by_name('Ground').tiles()]
+        objects = [(obj.x, obj.y, image_index(obj.image)) for obj in tmx_data.get_layer_by_name('Objects')]
+        collisions = [(obj.x, obj.y, obj.width, obj.height) for obj in tmx_data.get_layer_by_name('Collisions')]
+        entities = [(obj.name, obj.x, obj.y) for obj in tmx_data.get_layer_by_name('Entities')]
+        map_data = MapData(tmx_data.width, tmx_data.height, images, ground, objects, collisions, entities)
+        return map_data, [conversions[image] for image in images]
+
+class Preloader:
+    # Runs AssetManager decode steps on worker threads and their finish steps
+    # from pump(), a few milliseconds per frame, so the caches are warm by the
+    # time the game asks for anything.
+    def __init__(self, assets, workers = PRELOAD_WORKERS):
+        self.assets = assets
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix = 'preload')
+        self.jobs = []
+        self.steps = []
+        self.total = 0
+        self.done = 0
+
+    def submit(self, finish, decode, *args):
+        self.jobs.append((self.executor.submit(decode, *args), finish))
+        self.total += 1
+
+    def image(self, *parts, scale = None, size = None):
+        key = (parts, scale, size)
+        if key not in self.assets.images:
+            self.submit(partial(self.assets.finish_image, key), self.assets.decode_image, parts, scale, size)
+
+    def frames(self, *parts, scale = None):
+        for file_name in self.assets.frame_files(*parts):
+            self.image(*parts, file_name, scale = scale)
+
+    def sound(self, *parts):
+        if parts not in self.assets.sounds:
+            self.submit(partial(self.assets.finish_sound, parts), self.assets.decode_sound, parts)
+
+    def tmx(self, *parts):
+        if parts not in self.assets.maps:
+            self.submit(partial(self.assets.finish_map, parts), self.assets.decode_map, parts)
+
+    def step(self, func, *args):
+        # Main-thread work that needs the decoded assets, such as rendering
+        # rotation atlases. Steps run in order once every decode is finished.
+        self.steps.append(partial(func, *args))
+        self.total += 1
+
+    def run_step(self):
+        try:
+            self.steps.pop(0)()
+        except Exception as e:
+            print(f"Warning: Could not prepare asset: {e}")
+        self.done += 1
+
+    def progress(self):
+        return self.done / self.total if self.total else 1.0
+
+    def finished(self):
+        return not self.jobs and not self.steps
+
+    def finish(self, job):
+        future, finish = job
+        try:
+            finish(future.result())
+        except Exception as e:
+            print(f"Warning: Could not preload asset: {e}")
+        self.done += 1
+
+    def pump(self, budget = PRELOAD_FRAME_BUDGET):
+        start = time.perf_counter()
+        for job in [job for job in self.jobs if job[0].done()]:
+            self.jobs.remove(job)
+            self.finish(job)
+            if time.perf_counter() - start >= budget:
+                return
+        if not self.jobs:
+            self.executor.shutdown(wait = False)
+            while self.steps and time.perf_counter() - start < budget:
+                self.run_step()
+
+    def finish_all(self):
+        while self.jobs:
+            self.finish(self.jobs.pop(0))
+        self.executor.shutdown(wait = False)
+        while self.steps:
+            self.run_step()
+
+asset_manager = AssetManager()
@@ -0,0 +1,95 @@
+import pygame
+from settings import *
+
+def configure_mixer():
+    # Must run before pygame.init() for the buffer size to take effect.
+    pygame.mixer.pre_init(AUDIO_FREQUENCY, AUDIO_SIZE, 2, AUDIO_BUFFER)
+
+class VoicePool:
+    def __init__(self, sound, max_voices, volume = 1.0, steal = False):
+        self.sound = sound
+        self.sound.set_volume(volume)
+        self.max_voices = max_voices
+        self.steal = steal
+        self.channels = []
+        self.last_frame = None
+
+        self.played = 0
+        self.merged = 0
+        self.dropped = 0
+        self.stolen = 0
+        self.peak = 0
+
+    def active(self):
+        self.channels = [channel for channel in self.channels if channel.get_busy() and channel.get_sound() is self.sound]
+        return len(self.channels)
+
+    def play(self, frame):
+        if frame == self.last_frame:
+            self.merged += 1
+            return None
+        if self.active() >= self.max_voices:
+            if not self.steal:
+                self.dropped += 1
+                return None
+            self.channels.pop(0).stop()
+            self.stolen += 1
+        channel = self.sound.play()
+        if channel is None:
+            self.dropped += 1
+            return None
+
+        self.last_frame = frame
+        self.channels.append(channel)
+        self.played += 1
+        self.peak = max(self.peak, len(self.channels))
+        return channel
+
+    def stats(self):
+        return {'played': self.played, 'merged': self.merged, 'dropped': self.dropped, 'stolen': self.stolen, 'peak_voices': self.peak}
+
+class AudioEngine:
+    # Music is streamed from disk through pygame.mixer.music. Effects go
+    # through voice pools that play a sound at most once per frame and on at
+    # most max_voices channels, so a burst of hits costs a fixed amount of
+    # mixing however many enemies die.
+    def __init__(self, channels = AUDIO_CHANNELS):
+        self.enabled = pygame.mixer.get_init() is not None
+        if self.enabled:
+            pygame.mixer.set_num_channels(channels)
+        else:
+            print("Warning: Audio mixer is not available, continuing without sound")
+        self.channels = channels
+        self.pools = {}
+        self.frame = 0
+        self.busy = 0
+        self.peak_busy = 0
+
+    def voice_pool(self, name, sound, max_voices, volume = 1.0, steal = False):
+        self.pools[name] = VoicePool(sound, max_voices, volume, steal)
+        return self.pools[name]
+
+    def play(self, name):
+        pool = self.pools.get(name)
+        if pool is not None:
+            pool.play(self.frame)
+
+    def play_music(self, path, volume = MUSIC_VOLUME):
+        if not self.enabled:
+            return
+        try:
+            pygame.mixer.music.load(path)
+            pygame.mixer.music.set_volume(volume)
+            pygame.mixer.music.play(loops=-1)
+        except pygame.error as e:
+            print(f"Warning: Could not stream music {path}: {e}")
+
+    def end_frame(self):
+        self.frame += 1
+        self.busy = sum(pool.active() for pool in self.pools.values())
+        self.peak_busy = max(self.peak_busy, self.busy)
+
+    def stats(self):
+        stats = {'channels': self.channels, 'busy': self.busy, 'peak_busy': self.peak_busy}
+        stats.update((name, pool.stats()) for name, pool in self.pools.items())
+        return stats
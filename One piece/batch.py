@@ -0,0 +1,123 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+from settings import *
+from headless import run_session
+from assets import asset_manager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
+import argparse
+import itertools
+import json
+import multiprocessing
+import statistics
+import sys
+import time
+
+GAME_ATTRIBUTES = ('gun_cooldown', 'enemy_speed', 'player_max_health', 'use_enemy_swarm', 'use_bullet_arrays', 'use_map_streaming')
+
+def apply_params(params, game):
+    for name in GAME_ATTRIBUTES:
+        if name in params:
+            setattr(game, name, params[name])
+    if 'spawn_rate' in params:
+        game.director.waves = tuple(dict(wave, interval = wave['interval'] / params['spawn_rate']) for wave in game.director.waves)
+    if 'enemy_budget' in params:
+        game.director.budget = params['enemy_budget']
+    if 'map' in params or 'map_scale' in params:
+        map_data = asset_manager.tmx('data', 'maps', params.get('map', 'world.tmx'))
+        scale = params.get('map_scale', 1)
+        game.load_level(map_data.tiled(scale) if scale > 1 else map_data)
+
+def run_job(params, seed, frames, timestep, script, bot):
+    result = run_session(frames, seed, script, timestep, bot = bot, configure = partial(apply_params, params))
+    result['params'] = params
+    return result
+
+def parse_value(text):
+    try:
+        return json.loads(text)
+    except ValueError:
+        return text
+
+def parse_sweep(entries):
+    # Each entry is name=v1,v2,... and the runs cover every combination.
+    names, values = [], []
+    for entry in entries:
+        name, _, options = entry.partition('=')
+        if name not in GAME_ATTRIBUTES + ('spawn_rate', 'enemy_budget', 'map', 'map_scale'):
+            raise SystemExit(f"Unknown parameter {name}")
+        names.append(name)
+        values.append([parse_value(option) for option in options.split(',')])
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+def describe(values):
+    return {'mean': statistics.fmean(values), 'min': min(values), 'max': max(values),
+            'stdev': statistics.pstdev(values)}
+
+def aggregate(params, sessions):
+    return {
+        'params': params,
+        'sessions': len(sessions),
+        'score': describe([session['score'] for session in sessions]),
+        'survival_seconds': describe([session['survival_seconds'] for session in sessions]),
+        'deaths': describe([session['deaths'] for session in sessions]),
+        'peak_enemies': describe([session['peak_enemies'] for session in sessions]),
+        'peak_bullets': describe([session['peak_bullets'] for session in sessions]),
+        'peak_sprites': describe([session['peak_sprites'] for session in sessions]),
+        'frame_ms': {name: describe([session['frame_ms'][name] for session in sessions])
+                     for name in ('mean', 'p50', 'p95', 'p99', 'max')},
+        'simulated_fps': describe([session['simulated_fps'] for session in sessions]),
+    }
+
+def run_batch(configurations, sessions, frames, timestep = SIMULATION_TIMESTEP, script = None, bot = True, workers = None):
+    workers = workers or os.cpu_count()
+    jobs = [(params, seed) for params in configurations for seed in range(sessions)]
+    results = []
+    start = time.perf_counter()
+    # Each session runs in its own process with its own display and mixer;
+    # spawn keeps the workers from inheriting SDL state from this one.
+    with ProcessPoolExecutor(workers, mp_context = multiprocessing.get_context('spawn')) as executor:
+        futures = [executor.submit(run_job, params, seed, frames, timestep, script, bot) for params, seed in jobs]
+        for future in as_completed(futures):
+            try:
+                results.append(future.result())
+            except Exception as e:
+                print(f"Warning: Session failed: {e}", file=sys.stderr)
+            print(f"\r{len(results)}/{len(jobs)} sessions", end='', file=sys.stderr, flush=True)
+    print(file=sys.stderr)
+
+    results.sort(key=lambda result: (configurations.index(result['params']), result['seed']))
+    return {
+        'frames': frames,
+        'timestep': timestep,
+        'workers': workers,
+        'wall_seconds': time.perf_counter() - start,
+        'configurations': [aggregate(params, [result for result in results if result['params'] == params])
+                           for params in configurations if any(result['params'] == params for result in results)],
+        'sessions': results,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run many seeded headless sessions across a process pool.')
+    parser.add_argument('--sessions', type=int, default=8, help='seeded sessions per configuration')
+    parser.add_argument('--frames', type=int, default=3600)
+    parser.add_argument('--timestep', type=float, default=SIMULATION_TIMESTEP)
+    parser.add_argument('--workers', type=int, help='worker processes, all cores by default')
+    parser.add_argument('--script', help='play every session from this scripted input instead of the bot')
+    parser.add_argument('--sweep', action='append', default=[], metavar='NAME=V1,V2',
+                        help=f"parameter values to cover, one of {', '.join(GAME_ATTRIBUTES)}, spawn_rate, enemy_budget, map, map_scale")
+    parser.add_argument('--output', default='batch_results.json')
+    args = parser.parse_args()
+
+    report = run_batch(parse_sweep(args.sweep), args.sessions, args.frames, args.timestep, args.script, not args.script, args.workers)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+
+    for summary in report['configurations']:
+        print(f"{json.dumps(summary['params'])}: score {summary['score']['mean']:.0f}, "
+              f"survival {summary['survival_seconds']['mean']:.1f}s, peak enemies {summary['peak_enemies']['max']}, "
+              f"p95 frame {summary['frame_ms']['p95']['mean']:.2f} ms")
+    print(f"{len(report['sessions'])} sessions on {report['workers']} workers in {report['wall_seconds']:.1f}s, written to {args.output}")
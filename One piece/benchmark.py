@@ -0,0 +1,289 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from settings import *
+from main import Game
+from controls import ScriptedControls
+from timebase import SimulationClock, use_simulation_clock
+from assets import asset_manager
+from level import Level, StreamedLevel, surface_bytes
+from groups import bake_ground
+from spatial import CollisionGrid, FlowField
+from functools import partial
+import argparse
+import gc
+import json
+import math
+import random
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+class LegacySprite(pygame.sprite.Sprite):
+    # The map sprite from before the compact static world: a full Sprite in a
+    # Group with its own image, even for rect-only colliders.
+    def __init__(self, pos, surf, groups):
+        super().__init__(groups)
+        self.image = surf
+        self.rect = self.image.get_rect(topleft = pos)
+
+def build_legacy_level(map_data):
+    ground_chunks = bake_ground(map_data.ground_tiles())
+    collision_sprites = pygame.sprite.Group()
+    objects = [LegacySprite((x, y), image, collision_sprites) for x, y, image in map_data.object_tiles()]
+    colliders = [LegacySprite((x, y), pygame.Surface((width, height), pygame.SRCALPHA), collision_sprites)
+                 for x, y, width, height in map_data.collisions]
+    collision_grid = CollisionGrid(collision_sprites)
+    flow_field = FlowField(map_data.width, map_data.height, collision_sprites)
+    surfaces = sum(surface_bytes(surf) for surf in ground_chunks.values()) + sum(surface_bytes(sprite.image) for sprite in colliders)
+    return (ground_chunks, collision_sprites, objects, collision_grid, flow_field), surfaces
+
+def measure_build(build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    built = build()
+    build_time = time.perf_counter() - start
+    python_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return built, build_time, python_bytes
+
+SUBSYSTEMS = ('player', 'enemies', 'bullets', 'bullet_collision', 'player_collision', 'draw', 'display')
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+class Benchmark:
+    def __init__(self, seed = 0, timestep = SIMULATION_TIMESTEP, enemy_swarm = ENEMY_SWARM, dirty_rects = DIRTY_RECTS, bullet_arrays = BULLET_ARRAYS,
+                 map_streaming = MAP_STREAMING):
+        self.clock = SimulationClock()
+        use_simulation_clock(self.clock)
+        self.timestep = timestep
+        self.seed = seed
+
+        script = [{'frame': frame, 'keys': [key], 'mouse': mouse, 'buttons': [0, 0, 0]}
+                  for frame, key, mouse in ((0, 'd', (900, 360)), (30, 's', (640, 600)), (60, 'a', (300, 360)), (90, 'w', (640, 100)))]
+        self.controls = ScriptedControls(script)
+        self.game = Game(controls = self.controls, seed = seed)
+        self.game.use_enemy_swarm = enemy_swarm
+        self.game.use_dirty_rects = dirty_rects
+        self.game.use_bullet_arrays = bullet_arrays
+        self.game.use_map_streaming = map_streaming
+        self.level_load_time = 0.0
+        self.map_scale = None
+        self.density = None
+
+    def use_map(self, scale):
+        if scale != self.map_scale:
+            map_data = asset_manager.tmx('data', 'maps', 'world.tmx')
+            map_data = map_data.tiled(scale) if scale > 1 else map_data
+            start = time.perf_counter()
+            self.game.load_level(map_data)
+            self.game.start_game()
+            self.level_load_time = time.perf_counter() - start
+            self.map_scale = scale
+        else:
+            self.game.start_game()
+        self.random = random.Random(self.seed)
+
+    def build_level(self, map_data):
+        if self.game.use_map_streaming:
+            level = StreamedLevel(map_data)
+            level.update(level.player_start, None)
+            return level
+        return Level(map_data)
+
+    def level_memory(self, scale, legacy = False):
+        # Builds the level alone and reports what it keeps resident. Surface
+        # memory is allocated by SDL, so it is summed from the surfaces rather
+        # than traced. With legacy, the Sprite and Group level used before the
+        # compact static world is built and measured the same way.
+        map_data = asset_manager.tmx('data', 'maps', 'world.tmx')
+        map_data = map_data.tiled(scale) if scale > 1 else map_data
+        level, build_time, python_bytes = measure_build(partial(self.build_level, map_data))
+        result = {
+            'map_scale': scale,
+            'map_streaming': self.game.use_map_streaming,
+            'build_ms': build_time * 1000,
+            'objects': len(level.object_sprites),
+            'colliders': len(level.collision_grid),
+            'python_bytes': python_bytes,
+            'surface_bytes': level.resident_bytes(),
+        }
+        del level
+        if legacy:
+            (_, surfaces), build_time, python_bytes = measure_build(partial(build_legacy_level, map_data))
+            result['legacy'] = {'build_ms': build_time * 1000, 'python_bytes': python_bytes, 'surface_bytes': surfaces}
+        return result
+
+    def fill(self, enemies, bullets):
+        game = self.game
+        center = pygame.Vector2(game.player.rect.center)
+        frames = list(game.enemy_frames.values())
+        spread = 500 * math.sqrt(enemies / self.density) if self.density else 1500
+        while len(game.enemy_sprites) < enemies:
+            offset = pygame.Vector2(self.random.uniform(-spread, spread), self.random.uniform(-spread, spread))
+            game.spawn_enemy(center + offset, self.random.choice(frames))
+        while game.bullet_count() < bullets:
+            direction = pygame.Vector2(1, 0).rotate(self.random.uniform(0, 360))
+            origin = center + direction * self.random.uniform(0, 600)
+            if game.bullet_manager is not None:
+                game.bullet_manager.fire(origin, direction)
+            else:
+                game.bullet_pool.acquire(game.bullet_images, origin, direction, (game.all_sprites, game.bullet_sprites))
+
+        game.player_current_health = game.player_max_health
+        game.game_active = True
+
+    def step(self, frame):
+        game = self.game
+        timings = {}
+        dt = self.timestep
+
+        self.controls.set_frame(frame % 120)
+        self.clock.advance(dt * 1000)
+        pygame.event.pump()
+
+        start = time.perf_counter()
+        game.player.update(dt)
+        game.gun.update(dt)
+        timings['player'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        game.flow_field.set_target(game.player.hitbox_rect.center)
+        for enemy in game.enemy_sprites.sprites():
+            enemy.update(dt)
+        if game.enemy_swarm is not None:
+            game.enemy_swarm.update(dt)
+        game.rebuild_enemy_grid()
+        timings['enemies'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for bullet in game.bullet_sprites.sprites():
+            bullet.update(dt)
+        if game.bullet_manager is not None:
+            game.bullet_manager.update(dt)
+        timings['bullets'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        game.handle_bullet_collision()
+        timings['bullet_collision'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        game.handle_player_collision()
+        timings['player_collision'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        game.draw()
+        timings['draw'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        game.all_sprites.present()
+        timings['display'] = time.perf_counter() - start
+        return timings
+
+    def run(self, enemies, bullets, map_scale, frames):
+        self.use_map(map_scale)
+        samples = {name: [] for name in SUBSYSTEMS}
+        totals = []
+        for frame in range(frames):
+            self.fill(enemies, bullets)
+            timings = self.step(frame)
+            for name, value in timings.items():
+                samples[name].append(value * 1000)
+            totals.append(sum(timings.values()) * 1000)
+
+        self.fill(enemies, bullets)
+        tracemalloc.start()
+        for frame in range(3):
+            self.step(frames + frame)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        frame_mean = sum(totals) / len(totals)
+        enemy_mean = sum(samples['enemies']) / len(samples['enemies'])
+        result = {
+            'enemies': enemies,
+            'bullets': bullets,
+            'map_scale': map_scale,
+            'density': self.density,
+            'enemy_swarm': self.game.enemy_swarm is not None,
+            'bullet_arrays': self.game.bullet_manager is not None,
+            'map_streaming': self.game.use_map_streaming,
+            'level_load_ms': self.level_load_time * 1000,
+            'level_resident_bytes': self.game.level.resident_bytes(),
+            'frames': frames,
+            'frame_mean_ms': frame_mean,
+            'frame_p95_ms': percentile(totals, 0.95),
+            'fps': 1000 / frame_mean if frame_mean else 0.0,
+            'enemy_us_per_enemy': enemy_mean * 1000 / enemies if enemies else 0.0,
+            'subsystems': {name: {'mean_ms': sum(values) / len(values), 'p95_ms': percentile(values, 0.95)}
+                           for name, values in samples.items()},
+            'dirty_rects': self.game.use_dirty_rects,
+            'blits': self.game.all_sprites.blit_count,
+            'draw_stats': dict(self.game.all_sprites.draw_stats),
+            'narrow_phase_tests': self.game.narrow_phase_tests,
+            'peak_traced_bytes': peak_memory,
+        }
+        if resource is not None:
+            result['max_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return result
+
+def parse_counts(text):
+    return [int(value) for value in text.split(',') if value]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Time the per-frame hot paths under controlled loads.')
+    parser.add_argument('--enemies', default='10,100,1000,5000')
+    parser.add_argument('--bullets', default='0,100,500')
+    parser.add_argument('--map-scale', default='1,4', help='copies of world.tmx along each axis')
+    parser.add_argument('--frames', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--swarm', action='store_true', help='use the NumPy enemy swarm')
+    parser.add_argument('--bullet-arrays', action='store_true', help='use the NumPy bullet manager')
+    parser.add_argument('--streaming', action='store_true', help='load map regions around the player on demand')
+    parser.add_argument('--dirty-rects', action='store_true', help='redraw and present only the regions that changed')
+    parser.add_argument('--density', type=float, help='spread enemies to keep this many per 1000x1000 px')
+    parser.add_argument('--level-memory', action='store_true', help='only report the memory and build time of each map scale')
+    parser.add_argument('--legacy', action='store_true', help='with --level-memory, also build the old Sprite and Group level')
+    parser.add_argument('--output', help='write results to this JSON file instead of stdout')
+    args = parser.parse_args()
+
+    benchmark = Benchmark(args.seed, enemy_swarm = args.swarm or ENEMY_SWARM,
+                          dirty_rects = args.dirty_rects or DIRTY_RECTS, bullet_arrays = args.bullet_arrays or BULLET_ARRAYS,
+                          map_streaming = args.streaming or MAP_STREAMING)
+    benchmark.density = args.density
+    results = []
+    for map_scale in parse_counts(args.map_scale):
+        if args.level_memory:
+            result = benchmark.level_memory(map_scale, args.legacy)
+            results.append(result)
+            print(f"map x{map_scale}: {result['build_ms']:.0f} ms, {result['python_bytes'] / 2 ** 20:.1f} MB objects, "
+                  f"{result['surface_bytes'] / 2 ** 20:.1f} MB surfaces", file=sys.stderr)
+            if 'legacy' in result:
+                legacy = result['legacy']
+                print(f"  legacy: {legacy['build_ms']:.0f} ms, {legacy['python_bytes'] / 2 ** 20:.1f} MB objects, "
+                      f"{legacy['surface_bytes'] / 2 ** 20:.1f} MB surfaces", file=sys.stderr)
+            continue
+        for enemies in parse_counts(args.enemies):
+            for bullets in parse_counts(args.bullets):
+                result = benchmark.run(enemies, bullets, map_scale, args.frames)
+                results.append(result)
+                print(f"map x{map_scale} enemies {enemies} bullets {bullets}: {result['frame_mean_ms']:.2f} ms "
+                      f"({result['fps']:.0f} fps, {result['enemy_us_per_enemy']:.1f} us per enemy)", file=sys.stderr)
+
+    report = json.dumps({'timestep': benchmark.timestep, 'seed': args.seed, 'results': results}, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(report)
+    else:
+        print(report)
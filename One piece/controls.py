@@ -0,0 +1,112 @@
+import pygame
+from settings import *
+import json
+import random
+
+class LiveControls:
+    def get_pressed(self):
+        return pygame.key.get_pressed()
+
+    def get_mouse_pos(self):
+        return pygame.mouse.get_pos()
+
+    def get_mouse_pressed(self):
+        return pygame.mouse.get_pressed()
+
+class ScriptedKeys:
+    def __init__(self, pressed):
+        self.pressed = pressed
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+class ScriptedControls:
+    # A script is a list of input states, each applying from its frame
+    # until the next one, e.g.
+    #   {"frame": 0, "keys": ["w", "d"], "mouse": [900, 200], "buttons": [1, 0, 0]}
+    # Missing fields keep their previous value.
+    def __init__(self, entries = ()):
+        self.entries = sorted(entries, key=lambda entry: entry['frame'])
+        self.next_entry = 0
+        self.keys = ScriptedKeys(frozenset())
+        self.mouse_pos = (WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2)
+        self.mouse_buttons = (False, False, False)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as file:
+            text = file.read().strip()
+        if text.startswith('['):
+            return cls(json.loads(text))
+        return cls(json.loads(line) for line in text.splitlines() if line.strip())
+
+    def set_frame(self, frame):
+        while self.next_entry < len(self.entries) and self.entries[self.next_entry]['frame'] <= frame:
+            entry = self.entries[self.next_entry]
+            if 'keys' in entry:
+                self.keys = ScriptedKeys(frozenset(pygame.key.key_code(name) for name in entry['keys']))
+            if 'mouse' in entry:
+                self.mouse_pos = tuple(entry['mouse'])
+            if 'buttons' in entry:
+                self.mouse_buttons = tuple(bool(button) for button in entry['buttons'])
+            self.next_entry += 1
+
+    def get_pressed(self):
+        return self.keys
+
+    def get_mouse_pos(self):
+        return self.mouse_pos
+
+    def get_mouse_pressed(self):
+        return self.mouse_buttons
+
+class BotControls:
+    # Plays from the game state: aims at the nearest live enemy with the
+    # trigger held, backs away from any enemy inside danger_radius and
+    # otherwise wanders in a direction re-rolled from its seed.
+    def __init__(self, seed = 0, danger_radius = 250, wander_frames = 60):
+        self.random = random.Random(seed)
+        self.danger_radius = danger_radius
+        self.wander_frames = wander_frames
+        self.game = None
+        self.wander = (0, 0)
+        self.keys = ScriptedKeys(frozenset())
+        self.mouse_pos = (WINDOW_WIDTH // 2, WINDOW_HEIGHT // 2)
+        self.mouse_buttons = (True, False, False)
+
+    def attach(self, game):
+        self.game = game
+
+    def nearest_enemy(self, pos):
+        enemies = [enemy for enemy in self.game.enemy_sprites if enemy.death_time == 0]
+        return min(enemies, key=lambda enemy: pos.distance_squared_to(enemy.hitbox_rect.center), default=None)
+
+    def set_frame(self, frame):
+        if frame % self.wander_frames == 0:
+            self.wander = (self.random.choice((-1, 0, 1)), self.random.choice((-1, 0, 1)))
+        move_x, move_y = self.wander
+
+        game = self.game
+        if game is not None and game.player is not None and game.enemy_sprites is not None:
+            pos = pygame.Vector2(game.player.rect.center)
+            target = self.nearest_enemy(pos)
+            if target is not None:
+                offset = pygame.Vector2(target.hitbox_rect.center) - pos
+                self.mouse_pos = (WINDOW_WIDTH / 2 + offset.x, WINDOW_HEIGHT / 2 + offset.y)
+                if offset.length() < self.danger_radius:
+                    move_x = (offset.x < 0) - (offset.x > 0)
+                    move_y = (offset.y < 0) - (offset.y > 0)
+
+        keys = {pygame.K_d if move_x > 0 else pygame.K_a} if move_x else set()
+        if move_y:
+            keys.add(pygame.K_s if move_y > 0 else pygame.K_w)
+        self.keys = ScriptedKeys(frozenset(keys))
+
+    def get_pressed(self):
+        return self.keys
+
+    def get_mouse_pos(self):
+        return self.mouse_pos
+
+    def get_mouse_pressed(self):
+        return self.mouse_buttons
@@ -0,0 +1,72 @@
+import pygame
+from settings import *
+
+class SpawnDirector:
+    def __init__(self, waves = SPAWN_WAVES, budget = ENEMY_BUDGET, target_frame_time = TARGET_FRAME_TIME, feedback = SPAWN_FEEDBACK):
+        self.waves = waves
+        self.budget = budget
+        self.target_frame_time = target_frame_time
+        self.feedback = feedback
+
+        self.start_time = 0
+        self.next_spawn_time = 0
+        self.wave_index = 0
+        self.frame_time = target_frame_time
+        self.budget_scale = 1.0
+        self.spawned = 0
+        self.throttled = 0
+
+    def restart(self, now):
+        self.start_time = now
+        self.next_spawn_time = now + self.waves[0]['interval']
+        self.wave_index = 0
+        self.frame_time = self.target_frame_time
+        self.budget_scale = 1.0
+        self.spawned = 0
+        self.throttled = 0
+
+    def wave_at(self, time):
+        elapsed = time - self.start_time
+        for index, wave in enumerate(self.waves):
+            if wave['duration'] is None or elapsed < wave['duration']:
+                return index
+            elapsed -= wave['duration']
+        return len(self.waves) - 1
+
+    def record_frame(self, frame_time):
+        if not self.feedback:
+            return
+        self.frame_time += (frame_time - self.frame_time) * 0.1
+        if self.frame_time > self.target_frame_time:
+            self.budget_scale = max(SPAWN_BUDGET_FLOOR, self.budget_scale * 0.95)
+        else:
+            self.budget_scale = min(1.0, self.budget_scale + 0.01)
+
+    def live_budget(self):
+        return int(self.budget * self.budget_scale)
+
+    def update(self, now, live_enemies):
+        due = 0
+        while now >= self.next_spawn_time:
+            wave = self.waves[self.wave_at(self.next_spawn_time)]
+            due += wave['batch']
+            self.next_spawn_time += wave['interval']
+        self.wave_index = self.wave_at(now)
+
+        if self.feedback and self.frame_time > self.target_frame_time:
+            self.throttled += due
+            return 0
+        count = max(0, min(due, self.live_budget() - live_enemies))
+        self.throttled += due - count
+        self.spawned += count
+        return count
+
+    def enemy_types(self, enemy_frames):
+        names = self.waves[self.wave_index].get('enemies') or sorted(enemy_frames)
+        return [enemy_frames[name] for name in names if name in enemy_frames] or list(enemy_frames.values())
+
+    def spawn_points(self, positions, camera_center):
+        view = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT).inflate(SPAWN_MARGIN * 2, SPAWN_MARGIN * 2)
+        view.center = camera_center
+        hidden = [pos for pos in positions if not view.collidepoint(pos)]
+        return hidden or positions
@@ -1,14 +1,246 @@
 import pygame
 from settings import *
+from bisect import bisect_left, bisect_right
+from heapq import merge
+
+def bake_ground(tiles):
+    chunk_pixels = CHUNK_SIZE * TILE_SIZE
+    chunks = {}
+    for x, y, image in tiles:
+        chunk = (x // CHUNK_SIZE, y // CHUNK_SIZE)
+        if chunk not in chunks:
+            chunks[chunk] = pygame.Surface((chunk_pixels, chunk_pixels))
+        chunks[chunk].blit(image, ((x % CHUNK_SIZE) * TILE_SIZE, (y % CHUNK_SIZE) * TILE_SIZE))
+    return chunks
 
 class AllSprites(pygame.sprite.Group):
-    def __init__(self):
+    def __init__(self, ground_chunks = None, partial_updates = DIRTY_RECTS):
         super().__init__()
         self.display_surface = pygame.display.get_surface()
+        self.screen_rect = self.display_surface.get_rect()
         self.offset = pygame.Vector2()
+        self.ground_chunks = ground_chunks if ground_chunks is not None else {}
+        self.chunk_pixels = CHUNK_SIZE * TILE_SIZE
+        self.blit_count = 0
+        self.draw_stats = {'chunks': 0, 'batched': 0}
+
+        self.overlay_sprites = {}
+        self.static_sprites = {}
+        self.static_order = []
+        self.static_bottoms = []
+        self.static_height = 0
+        self.static_dirty = False
+        self.actors = set()
+        self.actor_order = []
+        self.ordered_actors = set()
+
+        self.previous_positions = {}
+        self.batches = []
+
+        self.partial_updates = partial_updates
+        self.background = None
+        self.background_offset = None
+        self.drawn_rects = []
+        self.dirty_rects = []
+        self.hud = []
+        self.full_update = True
+
+    def add_internal(self, sprite, layer = None):
+        super().add_internal(sprite, layer)
+        if getattr(sprite, 'layer', 'main') == 'overlay':
+            self.overlay_sprites[sprite] = None
+        else:
+            self.actors.add(sprite)
+            if sprite not in self.ordered_actors:
+                self.ordered_actors.add(sprite)
+                self.actor_order.append(sprite)
+
+    def remove_internal(self, sprite):
+        super().remove_internal(sprite)
+        self.overlay_sprites.pop(sprite, None)
+        self.actors.discard(sprite)
+        # Removed actors stay in actor_order until it is compacted. Do it here
+        # as well as when sorting, so runs that never draw do not keep every
+        # dead sprite alive.
+        if len(self.actor_order) > len(self.actors) * 2 + 16:
+            self.compact_actors()
+
+    def add_static(self, objects):
+        # Map objects are slotted StaticObjects rather than Sprites, so they
+        # are kept here beside the group and survive empty().
+        for obj in objects:
+            self.static_sprites[obj] = None
+        self.static_dirty = True
+
+    def remove_static(self, objects):
+        for obj in objects:
+            self.static_sprites.pop(obj, None)
+        self.static_dirty = True
+
+    def sprite_count(self):
+        return len(self) + len(self.static_sprites)
+
+    def sort_static(self):
+        self.static_order = sorted(self.static_sprites, key=lambda sprite: sprite.rect.bottom)
+        self.static_bottoms = [sprite.rect.bottom for sprite in self.static_order]
+        self.static_height = max((sprite.rect.height for sprite in self.static_order), default=0)
+        self.static_dirty = False
+
+    def compact_actors(self):
+        self.actor_order = [sprite for sprite in self.actor_order if sprite in self.actors]
+        self.ordered_actors = set(self.actor_order)
+
+    def sort_actors(self):
+        if len(self.actor_order) > len(self.actors):
+            self.compact_actors()
+        self.actor_order.sort(key=lambda sprite: sprite.rect.bottom)
+
+    def render_queue(self, camera_rect):
+        if self.static_dirty:
+            self.sort_static()
+        self.sort_actors()
+
+        start = bisect_left(self.static_bottoms, camera_rect.top)
+        end = bisect_right(self.static_bottoms, camera_rect.bottom + self.static_height)
+        stats = self.draw_stats
+
+        static = [sprite for sprite in self.static_order[start:end] if sprite.rect.colliderect(camera_rect)]
+        actors = [sprite for sprite in self.actor_order if sprite.rect.colliderect(camera_rect)]
+        overlay = [sprite for sprite in self.overlay_sprites if sprite.rect.colliderect(camera_rect)]
+        stats['objects'] = len(static)
+        stats['actors'] = len(actors)
+        stats['overlay'] = len(overlay)
+        stats['culled'] = self.sprite_count() - len(static) - len(actors) - len(overlay)
+
+        yield from merge(static, actors, key=lambda sprite: sprite.rect.bottom)
+        yield from overlay
 
-    def draw(self, target_pos):
+    def snapshot(self):
+        positions = {sprite: sprite.rect.topleft for sprite in self.actor_order}
+        positions.update((sprite, sprite.rect.topleft) for sprite in self.overlay_sprites)
+        self.previous_positions = positions
+
+    def interpolate(self, sprite, alpha):
+        x, y = sprite.rect.topleft
+        previous = self.previous_positions.get(sprite)
+        if alpha >= 1 or previous is None:
+            return x, y
+        previous_x, previous_y = previous
+        if abs(x - previous_x) > INTERPOLATION_LIMIT or abs(y - previous_y) > INTERPOLATION_LIMIT:
+            return x, y
+        return round(previous_x + (x - previous_x) * alpha), round(previous_y + (y - previous_y) * alpha)
+
+    def invalidate(self):
+        self.background_offset = None
+
+    def draw_ground(self, camera_rect, surface = None):
+        surface = surface or self.display_surface
+        left = camera_rect.left // self.chunk_pixels
+        right = (camera_rect.right - 1) // self.chunk_pixels
+        top = camera_rect.top // self.chunk_pixels
+        bottom = (camera_rect.bottom - 1) // self.chunk_pixels
+
+        for chunk_y in range(top, bottom + 1):
+            for chunk_x in range(left, right + 1):
+                surf = self.ground_chunks.get((chunk_x, chunk_y))
+                if surf:
+                    pos = (chunk_x * self.chunk_pixels + self.offset.x, chunk_y * self.chunk_pixels + self.offset.y)
+                    surface.blit(surf, pos)
+                    self.draw_stats['chunks'] += 1
+
+    def redraw_background(self, area, camera_rect):
+        self.background.set_clip(area)
+        self.background.fill('black', area)
+        self.draw_ground(area.move(camera_rect.topleft), self.background)
+        self.background.set_clip(None)
+
+    def scroll_background(self, camera_rect):
+        if self.background is None:
+            self.background = pygame.Surface(self.screen_rect.size).convert()
+
+        offset = (int(self.offset.x), int(self.offset.y))
+        previous = self.background_offset
+        self.background_offset = offset
+        if previous is None:
+            self.redraw_background(self.screen_rect, camera_rect)
+            return True
+
+        dx, dy = offset[0] - previous[0], offset[1] - previous[1]
+        if (dx, dy) == (0, 0):
+            return False
+        if abs(dx) > SCROLL_REDRAW_DISTANCE or abs(dy) > SCROLL_REDRAW_DISTANCE:
+            self.redraw_background(self.screen_rect, camera_rect)
+            return True
+
+        self.background.scroll(dx, dy)
+        width, height = self.screen_rect.size
+        if dx:
+            self.redraw_background(pygame.Rect(0 if dx > 0 else width + dx, 0, abs(dx), height), camera_rect)
+        if dy:
+            self.redraw_background(pygame.Rect(0, 0 if dy > 0 else height + dy, width, abs(dy)), camera_rect)
+        return True
+
+    def add_dirty(self, rect):
+        if rect:
+            self.drawn_rects.append(rect)
+            if not self.full_update:
+                self.dirty_rects.append(rect)
+
+    def draw(self, target_pos, alpha = 1.0):
         self.offset.x = -(target_pos[0] - WINDOW_WIDTH / 2)
         self.offset.y = -(target_pos[1] - WINDOW_HEIGHT / 2)
-        for sprite in self:
-            self.display_surface.blit(sprite.image , sprite.rect.topleft + self.offset)
\ No newline at end of file
+        camera_rect = pygame.Rect(int(-self.offset.x), int(-self.offset.y), WINDOW_WIDTH, WINDOW_HEIGHT)
+        cull_rect = camera_rect if alpha >= 1 else camera_rect.inflate(INTERPOLATION_LIMIT * 2, INTERPOLATION_LIMIT * 2)
+
+        self.draw_stats['chunks'] = self.draw_stats['batched'] = 0
+        if not self.partial_updates:
+            self.display_surface.fill('black')
+            self.draw_ground(camera_rect)
+            for sprite in self.render_queue(cull_rect):
+                x, y = self.interpolate(sprite, alpha)
+                self.display_surface.blit(sprite.image , (x + self.offset.x, y + self.offset.y))
+            for batch in self.batches:
+                self.draw_stats['batched'] += len(batch.draw(self.display_surface, cull_rect, self.offset, alpha))
+            self.blit_count = self.sprite_count() - self.draw_stats['culled'] + self.draw_stats['chunks'] + self.draw_stats['batched']
+            self.drawn_rects = []
+            self.full_update = True
+            return
+
+        self.full_update = self.scroll_background(camera_rect)
+        if self.full_update:
+            self.display_surface.blit(self.background, (0, 0))
+            self.dirty_rects = []
+        else:
+            for rect in self.drawn_rects:
+                self.display_surface.blit(self.background, rect, rect)
+            self.dirty_rects = self.drawn_rects
+        self.drawn_rects = []
+
+        offset_x, offset_y = self.background_offset
+        for sprite in self.render_queue(cull_rect):
+            x, y = self.interpolate(sprite, alpha)
+            self.add_dirty(self.display_surface.blit(sprite.image, (x + offset_x, y + offset_y)))
+        for batch in self.batches:
+            rects = batch.draw(self.display_surface, cull_rect, self.background_offset, alpha)
+            self.draw_stats['batched'] += len(rects)
+            for rect in rects:
+                self.add_dirty(rect)
+        self.blit_count = self.sprite_count() - self.draw_stats['culled'] + self.draw_stats['chunks'] + self.draw_stats['batched']
+
+    def draw_hud(self, items):
+        # HUD surfaces are blitted over the sprites every frame and erased
+        # with them, but a HUD rect is only pushed when its surface or
+        # position changed. Sprites moving under the HUD push their own rects.
+        shown = [(surf, self.display_surface.blit(surf, pos)) for surf, pos in items]
+        self.drawn_rects.extend(rect for surf, rect in shown)
+        if not self.full_update:
+            previous = {(id(surf), tuple(rect)) for surf, rect in self.hud}
+            current = {(id(surf), tuple(rect)) for surf, rect in shown}
+            self.dirty_rects.extend(rect for surf, rect in self.hud + shown if (id(surf), tuple(rect)) not in previous & current)
+        self.hud = shown
+
+    def present(self):
+        if self.full_update or len(self.dirty_rects) > DIRTY_RECT_LIMIT:
+            pygame.display.update()
+        else:
+            pygame.display.update(self.dirty_rects)
@@ -0,0 +1,110 @@
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import pygame
+from settings import *
+from main import Game
+from controls import ScriptedControls, BotControls
+from timebase import SimulationClock, use_simulation_clock
+import argparse
+import json
+import time
+
+def frame_time_summary(times):
+    ordered = sorted(times)
+    if not ordered:
+        return {'mean': 0.0, 'p50': 0.0, 'p95': 0.0, 'p99': 0.0, 'max': 0.0}
+    pick = lambda fraction: ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+    return {'mean': sum(ordered) / len(ordered), 'p50': pick(0.5), 'p95': pick(0.95), 'p99': pick(0.99), 'max': ordered[-1]}
+
+def run_session(frames, seed = 0, script = None, timestep = SIMULATION_TIMESTEP, render = False, restart_on_death = True, trace = None, dirty_rects = DIRTY_RECTS,
+                bot = False, configure = None):
+    clock = SimulationClock()
+    use_simulation_clock(clock)
+    if bot:
+        controls = BotControls(seed)
+    else:
+        controls = ScriptedControls.from_file(script) if script else ScriptedControls()
+
+    game = Game(controls = controls, seed = seed)
+    game.use_dirty_rects = dirty_rects
+    if configure:
+        configure(game)
+    if bot:
+        controls.attach(game)
+    if trace:
+        game.profiler.open_trace(trace)
+    game.start_game()
+
+    simulated_frames = 0
+    deaths = 0
+    first_death = None
+    peak_enemies = 0
+    peak_bullets = 0
+    peak_sprites = 0
+    frame_times = []
+    start_time = time.perf_counter()
+    for frame in range(frames):
+        if not game.running:
+            break
+        if not game.game_active:
+            deaths += 1
+            if first_death is None:
+                first_death = simulated_frames
+            if not restart_on_death:
+                break
+            game.start_game()
+
+        controls.set_frame(frame)
+        clock.advance(timestep * 1000)
+        pygame.event.pump()
+        frame_start = time.perf_counter()
+        game.update(timestep)
+        if render:
+            game.draw()
+            game.all_sprites.present()
+        frame_times.append((time.perf_counter() - frame_start) * 1000)
+        game.profiler.end_frame(game.frame_counts())
+        simulated_frames += 1
+        peak_enemies = max(peak_enemies, len(game.enemy_sprites))
+        peak_bullets = max(peak_bullets, game.bullet_count())
+        peak_sprites = max(peak_sprites, game.all_sprites.sprite_count())
+    wall_time = time.perf_counter() - start_time
+    game.profiler.close()
+
+    return {
+        'seed': seed,
+        'frames': simulated_frames,
+        'simulated_seconds': simulated_frames * timestep,
+        'wall_seconds': wall_time,
+        'simulated_fps': simulated_frames / wall_time if wall_time else 0.0,
+        'score': game.score,
+        'deaths': deaths,
+        'survival_seconds': (simulated_frames if first_death is None else first_death) * timestep,
+        'health': game.player_current_health,
+        'peak_enemies': peak_enemies,
+        'peak_bullets': peak_bullets,
+        'peak_sprites': peak_sprites,
+        'frame_ms': frame_time_summary(frame_times),
+        'player_position': list(game.player.rect.center) if game.player else None,
+        'audio': game.audio.stats(),
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the game without a display at a fixed timestep.')
+    parser.add_argument('--frames', type=int, default=3600)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--script', help='JSON or JSON-lines file of scripted input')
+    parser.add_argument('--bot', action='store_true', help='play with a seeded bot that aims at the nearest enemy')
+    parser.add_argument('--timestep', type=float, default=SIMULATION_TIMESTEP)
+    parser.add_argument('--render', action='store_true', help='also draw every frame to the dummy display')
+    parser.add_argument('--stop-on-death', action='store_true')
+    parser.add_argument('--trace', help='write per-frame stage timings to a .csv or .jsonl file')
+    parser.add_argument('--dirty-rects', action='store_true', help='redraw and present only the regions that changed')
+    args = parser.parse_args()
+
+    result = run_session(args.frames, args.seed, args.script, args.timestep, args.render, not args.stop_on_death, args.trace,
+                         args.dirty_rects or DIRTY_RECTS, args.bot)
+    print(json.dumps(result, indent=2))
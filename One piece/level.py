@@ -0,0 +1,166 @@
+import pygame
+from settings import *
+from Sprites import StaticObject, Collider
+from groups import bake_ground
+from spatial import CollisionGrid, FlowField
+import time
+
+def surface_bytes(surf):
+    return surf.get_pitch() * surf.get_height()
+
+class Level:
+    def __init__(self, map_data):
+        self.map_data = map_data
+        self.ground_chunks = bake_ground(map_data.ground_tiles())
+
+        self.object_sprites = [StaticObject((x, y), image) for x, y, image in map_data.object_tiles()]
+        self.colliders = self.object_sprites + [Collider((x, y), (width, height)) for x, y, width, height in map_data.collisions]
+
+        self.collision_grid = CollisionGrid(self.colliders)
+        self.flow_field = FlowField(map_data.width, map_data.height, self.colliders)
+
+        self.player_start = None
+        spawn_positions = []
+        for name, x, y in map_data.entities:
+            if name == 'Player':
+                self.player_start = (x, y)
+            else:
+                spawn_positions.append((x, y))
+        self.spawn_positions = tuple(spawn_positions)
+
+    def update(self, pos, group):
+        return False
+
+    def resident_bytes(self):
+        return sum(surface_bytes(surf) for surf in self.ground_chunks.values())
+
+class Region:
+    def __init__(self, map_data):
+        self.ground_chunks = bake_ground(map_data.ground_tiles())
+        self.object_sprites = [StaticObject((x, y), image) for x, y, image in map_data.object_tiles()]
+        self.colliders = self.object_sprites + [Collider((x, y), (width, height)) for x, y, width, height in map_data.collisions]
+        self.spawn_positions = [(x, y) for name, x, y in map_data.entities if name != 'Player']
+        self.bytes = sum(surface_bytes(surf) for surf in self.ground_chunks.values())
+
+class StreamedLevel:
+    # Builds map regions (one ground chunk each) as the player comes within
+    # STREAM_RADIUS of them and drops regions outside it once the resident
+    # ones exceed STREAM_MEMORY_BUDGET, farthest first. A region's reach
+    # covers every collider and object it owns, so a long wall stays loaded
+    # while the player is near any part of it.
+    def __init__(self, map_data, radius = STREAM_RADIUS, memory_budget = STREAM_MEMORY_BUDGET, loads_per_frame = STREAM_LOADS_PER_FRAME):
+        self.map_data = map_data
+        self.regions = map_data.regions(CHUNK_SIZE)
+        self.region_pixels = CHUNK_SIZE * TILE_SIZE
+        self.reach = {key: self.region_reach(key, region) for key, region in self.regions.items()}
+        self.covering = {}
+        for key, (left, top, right, bottom) in self.reach.items():
+            for x in range(left, right + 1):
+                for y in range(top, bottom + 1):
+                    self.covering.setdefault((x, y), []).append(key)
+        self.radius = radius
+        self.memory_budget = memory_budget
+        self.loads_per_frame = loads_per_frame
+
+        self.ground_chunks = {}
+        self.collision_grid = CollisionGrid(())
+        self.flow_field = FlowField(map_data.width, map_data.height, ())
+        self.loaded = {}
+        self.pending = []
+        self.center = None
+        self.spawn_positions = ()
+
+        self.loads = 0
+        self.evictions = 0
+        self.load_time = 0.0
+
+        self.player_start = None
+        for name, x, y in map_data.entities:
+            if name == 'Player':
+                self.player_start = (x, y)
+
+    @property
+    def object_sprites(self):
+        return [sprite for region in self.loaded.values() for sprite in region.object_sprites]
+
+    def resident_bytes(self):
+        return sum(region.bytes for region in self.loaded.values())
+
+    def region_of(self, pos):
+        return int(pos[0]) // self.region_pixels, int(pos[1]) // self.region_pixels
+
+    def region_reach(self, key, map_data):
+        # (left, top, right, bottom) region keys spanned by the region and
+        # everything it owns.
+        left, top = right, bottom = key
+        rects = [(x, y, width, height) for x, y, width, height in map_data.collisions]
+        rects += [(x, y) + image.get_size() for x, y, image in map_data.object_tiles()]
+        for x, y, width, height in rects:
+            low_x, low_y = self.region_of((x, y))
+            high_x, high_y = self.region_of((x + max(width, 1) - 1, y + max(height, 1) - 1))
+            left, top, right, bottom = min(left, low_x), min(top, low_y), max(right, high_x), max(bottom, high_y)
+        return left, top, right, bottom
+
+    def region_distance(self, key, center):
+        left, top, right, bottom = self.reach[key]
+        return max(left - center[0], center[0] - right, top - center[1], center[1] - bottom, 0)
+
+    def view_regions(self, pos):
+        # Regions the camera can show from pos, plus a one region margin.
+        view = pygame.Rect(0, 0, WINDOW_WIDTH, WINDOW_HEIGHT).inflate(self.region_pixels * 2, self.region_pixels * 2)
+        view.center = (int(pos[0]), int(pos[1]))
+        left, top = self.region_of(view.topleft)
+        right, bottom = self.region_of((view.right - 1, view.bottom - 1))
+        return {key for x in range(left, right + 1) for y in range(top, bottom + 1) for key in self.covering.get((x, y), ())}
+
+    def load(self, key, group):
+        start = time.perf_counter()
+        region = Region(self.regions[key])
+        self.loaded[key] = region
+        self.ground_chunks.update(region.ground_chunks)
+        self.collision_grid.add(region.colliders)
+        if group is not None:
+            group.add_static(region.object_sprites)
+        self.loads += 1
+        self.load_time += time.perf_counter() - start
+
+    def unload(self, key, group):
+        region = self.loaded.pop(key)
+        for chunk in region.ground_chunks:
+            self.ground_chunks.pop(chunk, None)
+        self.collision_grid.remove(region.colliders)
+        if group is not None:
+            group.remove_static(region.object_sprites)
+        self.evictions += 1
+
+    def update(self, pos, group):
+        # Returns True when a region the camera can see was loaded, so a cached
+        # background has to be redrawn.
+        center = self.region_of(pos)
+        distance = lambda key: self.region_distance(key, center)
+        if center != self.center:
+            self.center = center
+            nearby = range(-self.radius, self.radius + 1)
+            keys = {key for dx in nearby for dy in nearby for key in self.covering.get((center[0] + dx, center[1] + dy), ())}
+            self.pending = sorted((key for key in keys if key not in self.loaded), key=lambda key: (distance(key), key))
+        if not self.pending:
+            return False
+
+        visible = self.view_regions(pos)
+        now = [key for key in self.pending if key in visible]
+        later = [key for key in self.pending if key not in visible]
+        loading = now + later[:max(0, self.loads_per_frame - len(now))]
+        for key in loading:
+            self.load(key, group)
+        self.pending = later[len(loading) - len(now):]
+
+        resident = self.resident_bytes()
+        for key in sorted(self.loaded, key=distance, reverse=True):
+            if resident <= self.memory_budget or distance(key) <= self.radius:
+                break
+            resident -= self.loaded[key].bytes
+            self.unload(key, group)
+
+        self.flow_field.set_obstacles(self.collision_grid)
+        self.spawn_positions = tuple(pos for region in self.loaded.values() for pos in region.spawn_positions)
+        return bool(now)
@@ -1,31 +1,64 @@
 import pygame
-from os.path import join
-import os
-from os import walk
 from settings import *
+from timebase import SimulationClock, use_simulation_clock, get_ticks
 from player import Player
-from Sprites import CollisionSprite, Sprite, Gun, Bullet, Enemy
+from Sprites import Gun, Bullet, Enemy, SpritePool, get_death_flash, get_rotations
 from groups import AllSprites
-from pytmx.util_pygame import load_pygame
-from random import choice
-from ui import Bar, Menu
+from spatial import DynamicGrid, segment_rect, segment_entry
+from level import Level, StreamedLevel
+from swarm import EnemySwarm, SwarmEnemy, np
+from projectiles import BulletManager
+from assets import asset_manager, Preloader
+from controls import LiveControls
+from profiler import FrameProfiler
+from director import SpawnDirector
+from audio import AudioEngine, configure_mixer
+import random
+from ui import Bar, Menu, CachedText
 
 class Game:
-    def __init__(self):
+    def __init__(self, controls = None, seed = None):
+        configure_mixer()
         pygame.init()
         self.display_surface = pygame.display.set_mode((WINDOW_WIDTH, WINDOW_HEIGHT))
         pygame.mouse.set_visible(True)
 
         self.clock = pygame.time.Clock()
+        self.simulation_clock = SimulationClock()
+        self.accumulator = 0.0
+        self.simulation_steps = 0
         self.running = True
         self.game_active = False
+        self.controls = controls if controls is not None else LiveControls()
+        self.random = random.Random(seed)
+        self.profiler = FrameProfiler()
+        if PROFILER_TRACE_FILE:
+            self.profiler.open_trace(PROFILER_TRACE_FILE)
 
+        self.audio = AudioEngine()
         self.menu = Menu(self.display_surface)
-        self.load_assets()
         self.set_window_properties()
+        self.assets_loaded = False
+        self.preloader = Preloader(asset_manager)
+        self.queue_assets()
 
+        self.level = None
         self.all_sprites = None
-        self.collision_sprites = None
+        self.collision_grid = None
+        self.flow_field = None
+        self.player = None
+        self.gun = None
+        self.enemy_grid = DynamicGrid()
+        self.enemy_swarm = None
+        self.use_enemy_swarm = ENEMY_SWARM
+        self.bullet_manager = None
+        self.use_bullet_arrays = BULLET_ARRAYS
+        self.use_dirty_rects = DIRTY_RECTS
+        self.use_map_streaming = MAP_STREAMING
+        self.bullet_pool = SpritePool(Bullet)
+        self.enemy_pool = SpritePool(Enemy)
+        self.swarm_enemy_pool = SpritePool(SwarmEnemy)
+        self.narrow_phase_tests = 0
         self.bullet_sprites = None
         self.enemy_sprites = None
 
@@ -33,9 +66,9 @@ class Game:
         self.shoot_time = 0
         self.gun_cooldown = 200
 
-        self.enemy_event = pygame.event.custom_type()
-        pygame.time.set_timer(self.enemy_event, 300)
-        self.spawn_positions = []
+        self.director = SpawnDirector()
+        self.enemy_speed = ENEMY_SPEED
+        self.spawn_positions = ()
 
         self.player_max_health = 100
         self.player_current_health = self.player_max_health
@@ -45,135 +78,252 @@ class Game:
         self.score = 0
         pygame.font.init()
         self.font = pygame.font.Font(None, 40)
+        self.score_text = CachedText(self.font, (255, 255, 255), "Score: {}")
 
     def set_window_properties(self):
-        icon_path = os.path.join('One piece/images/Logo/One.png')
+        icon_path = asset_manager.path('images', 'Logo', 'One.png')
         try:
-            icon = pygame.image.load(icon_path)
+            icon = asset_manager.image('images', 'Logo', 'One.png')
             pygame.display.set_icon(icon)
             pygame.display.set_caption('One Piece')
-        except pygame.error as e:
-            print(f"Warning: Could not load icon at {os.path.abspath(icon_path)}: {e}")
+        except (pygame.error, FileNotFoundError) as e:
+            print(f"Warning: Could not load icon at {icon_path}: {e}")
             pygame.display.set_caption('One Piece (No Icon)')
 
+    def queue_assets(self):
+        self.preloader.image('images', 'gun', 'bullet.png')
+        self.preloader.image('images', 'gun', 'gun.png')
+        for folder in asset_manager.folders('images', 'enemies'):
+            self.preloader.frames('images', 'enemies', folder)
+        self.preloader.image('images', 'player', 'Left', '0.png', scale = 2)
+        for folder in asset_manager.folders('images', 'player'):
+            self.preloader.frames('images', 'player', folder, scale = 1.75)
+        if self.audio.enabled:
+            self.preloader.sound('audio', 'shoot.wav')
+            self.preloader.sound('audio', 'impact.ogg')
+        self.preloader.tmx('data', 'maps', 'world.tmx')
+        for parts, steps in ((('images', 'gun', 'bullet.png'), BULLET_ANGLE_STEPS), (('images', 'gun', 'gun.png'), GUN_ANGLE_STEPS)):
+            for start in range(0, steps, ATLAS_BATCH):
+                self.preloader.step(self.build_rotations, parts, steps, start, start + ATLAS_BATCH)
+
+    def build_rotations(self, parts, steps, start, stop):
+        get_rotations(asset_manager.image(*parts), steps).build(start, stop)
+
+    def preload(self):
+        if not self.preloader.finished():
+            self.preloader.pump()
+            self.menu.set_progress(self.preloader.progress())
+        else:
+            self.finish_loading()
+            self.load_level()
+
+    def finish_loading(self):
+        if not self.assets_loaded:
+            self.preloader.finish_all()
+            self.load_assets()
+            self.assets_loaded = True
+            self.menu.set_progress(None)
+
     def load_assets(self):
         self.load_images()
         self.load_audio()
 
     def load_audio(self):
-        self.shoot_sound = pygame.mixer.Sound(join('One piece/audio/shoot.wav'))
-        self.shoot_sound.set_volume(0.4)
-        self.impact_sound = pygame.mixer.Sound(join('One piece/audio/impact.ogg'))
-        self.music = pygame.mixer.Sound(join('One piece/audio/1.ogg'))
-        self.music.set_volume(0.3)
-        self.music.play(loops=-1)
+        if not self.audio.enabled:
+            return
+        self.audio.voice_pool('shoot', asset_manager.sound('audio', 'shoot.wav'), SHOOT_VOICES, 0.4, steal = True)
+        self.audio.voice_pool('impact', asset_manager.sound('audio', 'impact.ogg'), IMPACT_VOICES)
+        self.audio.play_music(asset_manager.path('audio', '1.ogg'))
 
     def load_images(self):
-        bullet_image_path = os.path.join('One piece', 'images', 'gun', 'bullet.png')
         try:
-            self.bullet_surf = pygame.image.load(bullet_image_path).convert_alpha()
-        except pygame.error as e:
-            print(f"Error: Could not load bullet image at {os.path.abspath(bullet_image_path)}: {e}")
+            self.bullet_surf = asset_manager.image('images', 'gun', 'bullet.png')
+        except (pygame.error, FileNotFoundError) as e:
+            print(f"Error: Could not load bullet image at {asset_manager.path('images', 'gun', 'bullet.png')}: {e}")
             self.bullet_surf = pygame.Surface((10, 5)).convert_alpha()
             self.bullet_surf.fill('red')
+        self.bullet_images = get_rotations(self.bullet_surf, BULLET_ANGLE_STEPS).build()
 
-        folders = list(walk(join('One piece', 'images', 'enemies')))[0][1]
         self.enemy_frames = {}
-        for folder in folders:
-            folder_path = join('One piece', 'images', 'enemies', folder)
-            self.enemy_frames[folder] = []
-            for file_name in sorted(os.listdir(folder_path), key=lambda name: int(name.split('.')[0])):
-                if file_name.endswith('.png'):
-                    full_path = join(folder_path, file_name)
-                    try:
-                        surf = pygame.image.load(full_path).convert_alpha()
-                        self.enemy_frames[folder].append(surf)
-                    except pygame.error as e:
-                        print(f"Warning: Could not load enemy image {file_name} from {folder_path}: {e}")
+        for folder in asset_manager.folders('images', 'enemies'):
+            self.enemy_frames[folder] = asset_manager.frames('images', 'enemies', folder)
+            if self.enemy_frames[folder]:
+                get_death_flash(self.enemy_frames[folder][0])
+
+    def load_level(self, map_data = None):
+        if self.level is None or map_data is not None:
+            if self.level is not None:
+                self.clear_run()
+            try:
+                level_class = StreamedLevel if self.use_map_streaming else Level
+                self.level = level_class(map_data or asset_manager.tmx('data', 'maps', 'world.tmx'))
+            except Exception as e:
+                print(f"CRITICAL ERROR: Could not load TMX map: {e}")
+                self.running = False
+                return None
+
+            self.all_sprites = AllSprites(self.level.ground_chunks)
+            self.all_sprites.add_static(self.level.object_sprites)
+            self.bullet_sprites = pygame.sprite.Group()
+            self.enemy_sprites = pygame.sprite.Group()
+            self.collision_grid = self.level.collision_grid
+            self.flow_field = self.level.flow_field
+            self.spawn_positions = self.level.spawn_positions
+        return self.level
 
     def start_game(self):
         self.game_active = True
         pygame.mouse.set_visible(False)
 
-        self.all_sprites = AllSprites()
-        self.collision_sprites = pygame.sprite.Group()
-        self.bullet_sprites = pygame.sprite.Group()
-        self.enemy_sprites = pygame.sprite.Group()
+        self.finish_loading()
+        if not self.load_level():
+            return
+        self.clear_run()
+        self.stream_level(self.level.player_start)
 
         self.can_shoot = True
         self.shoot_time = 0
         self.score = 0
         self.player_current_health = self.player_max_health
         self.last_hit_time = 0
+        self.director.restart(get_ticks())
+        self.accumulator = 0.0
 
         self.setup_level()
+        self.all_sprites.partial_updates = self.use_dirty_rects
+        self.all_sprites.invalidate()
         self.ui = Bar(self.display_surface)
+        self.profiler.restart()
+
+    def clear_run(self):
+        for sprite in self.bullet_sprites.sprites() + self.enemy_sprites.sprites():
+            sprite.kill()
+        if self.player:
+            self.player.kill()
+            self.gun.kill()
+        self.all_sprites.empty()
+
+    def stream_level(self, pos):
+        if self.level.update(pos, self.all_sprites):
+            self.all_sprites.invalidate()
+        self.spawn_positions = self.level.spawn_positions
 
     def process_input(self):
-        mouse_buttons = pygame.mouse.get_pressed()
+        mouse_buttons = self.controls.get_mouse_pressed()
         if mouse_buttons[0] and self.can_shoot:
-            self.shoot_sound.play()
+            self.audio.play('shoot')
             if self.gun and hasattr(self.gun, 'player_direction'):
                 bullet_spawn_pos = self.gun.rect.center
                 bullet_direction = self.gun.player_direction
 
-                if hasattr(self, 'bullet_surf') and self.bullet_surf:
-                    Bullet(self.bullet_surf, bullet_spawn_pos, bullet_direction, (self.all_sprites, self.bullet_sprites))
+                if self.bullet_manager is not None:
+                    self.bullet_manager.fire(bullet_spawn_pos, bullet_direction, BULLET_PELLETS, BULLET_SPREAD)
+                    self.can_shoot = False
+                    self.shoot_time = get_ticks()
+                elif hasattr(self, 'bullet_images') and self.bullet_images:
+                    for pellet in range(BULLET_PELLETS):
+                        angle = BULLET_SPREAD * (pellet / (BULLET_PELLETS - 1) - 0.5) if BULLET_PELLETS > 1 else 0
+                        self.bullet_pool.acquire(self.bullet_images, bullet_spawn_pos, bullet_direction.rotate(angle), (self.all_sprites, self.bullet_sprites))
                     self.can_shoot = False
-                    self.shoot_time = pygame.time.get_ticks()
+                    self.shoot_time = get_ticks()
 
     def handle_gun_cooldown(self):
         if not self.can_shoot:
-            current_time = pygame.time.get_ticks()
+            current_time = get_ticks()
             if current_time - self.shoot_time >= self.gun_cooldown:
                 self.can_shoot = True
 
     def setup_level(self):
-        map_path = os.path.join(os.path.dirname(__file__), 'data', 'maps', 'world.tmx')
-        try:
-            self.tmx_data = load_pygame(map_path)
-        except Exception as e:
-            print(f"CRITICAL ERROR: Could not load TMX map: {e}")
-            self.running = False
-            return
-
-        if not hasattr(self, 'tmx_data') or self.tmx_data is None:
-            return
-
-        for x, y, image in self.tmx_data.get_layer_by_name('Ground').tiles():
-            Sprite((x * TILE_SIZE, y * TILE_SIZE), image, self.all_sprites)
-
-        for obj in self.tmx_data.get_layer_by_name('Objects'):
-            CollisionSprite((obj.x, obj.y), obj.image, (self.all_sprites, self.collision_sprites))
-
-        for obj in self.tmx_data.get_layer_by_name('Collisions'):
-            collision_surf = pygame.Surface((obj.width, obj.height), pygame.SRCALPHA)
-            CollisionSprite((obj.x, obj.y), collision_surf, self.collision_sprites)
-
-        for obj in self.tmx_data.get_layer_by_name('Entities'):
-            if obj.name == 'Player':
-                self.player = Player((obj.x, obj.y), self.all_sprites, self.collision_sprites, self.player_max_health)
-                self.gun = Gun(self.player, self.all_sprites)
-            else:
-                self.spawn_positions.append((obj.x, obj.y))
+        self.player = Player(self.level.player_start, self.all_sprites, self.collision_grid, self.player_max_health, self.controls)
+        self.gun = Gun(self.player, self.all_sprites)
+        self.enemy_swarm = self.create_enemy_swarm()
+        self.bullet_manager = self.create_bullet_manager()
+        self.all_sprites.batches = [self.bullet_manager] if self.bullet_manager is not None else []
+
+    def create_enemy_swarm(self):
+        if not self.use_enemy_swarm:
+            return None
+        if np is None:
+            print("Warning: ENEMY_SWARM needs numpy, falling back to per-sprite enemies")
+            return None
+        return EnemySwarm(self.player, self.collision_grid, self.flow_field)
+
+    def create_bullet_manager(self):
+        if not self.use_bullet_arrays:
+            return None
+        if np is None:
+            print("Warning: BULLET_ARRAYS needs numpy, falling back to bullet sprites")
+            return None
+        return BulletManager(self.bullet_images)
+
+    def bullet_count(self):
+        return len(self.bullet_sprites) + (len(self.bullet_manager) if self.bullet_manager is not None else 0)
+
+    def rebuild_enemy_grid(self):
+        if self.enemy_swarm is not None:
+            self.enemy_grid.rebuild_boxes(self.enemy_swarm.sprites, self.enemy_swarm.rect_boxes())
+        else:
+            self.enemy_grid.rebuild(self.enemy_sprites)
+
+    def spawn_enemy(self, pos, frames):
+        groups = (self.all_sprites, self.enemy_sprites)
+        if self.enemy_swarm is not None:
+            enemy = self.swarm_enemy_pool.acquire(self.enemy_swarm, pos, frames, groups)
+            self.enemy_swarm.speeds[enemy.slot] = self.enemy_speed
+        else:
+            enemy = self.enemy_pool.acquire(pos, frames, groups, self.player, self.collision_grid, self.flow_field, self.enemy_grid)
+        enemy.speed = self.enemy_speed
+
+    def handle_enemy_spawns(self):
+        count = self.director.update(get_ticks(), len(self.enemy_sprites))
+        if count and self.enemy_frames and self.spawn_positions:
+            positions = self.director.spawn_points(self.spawn_positions, self.player.rect.center)
+            enemy_types = self.director.enemy_types(self.enemy_frames)
+            for _ in range(count):
+                self.spawn_enemy(self.random.choice(positions), self.random.choice(enemy_types))
 
     def handle_bullet_collision(self):
-        if self.bullet_sprites and self.enemy_sprites:
-            for bullet in self.bullet_sprites:
-                hit_enemies = pygame.sprite.spritecollide(bullet, self.enemy_sprites, False, pygame.sprite.collide_mask)
-                if hit_enemies:
-                    self.impact_sound.play()
-                    for enemy in hit_enemies:
-                        if enemy.death_time == 0:
-                            enemy.destroy()
-                            self.score += 10
-                    bullet.kill()
+        self.narrow_phase_tests = 0
+        for bullet in self.bullet_sprites.sprites():
+            start, end = bullet.previous_center, bullet.rect.center
+            padding = bullet.radius * 2
+            wall_hit = self.collision_grid.segment_cast(start, end, bullet.radius)
+            hit_time = wall_hit[0] if wall_hit else None
+
+            target = None
+            for enemy in self.enemy_grid.query(segment_rect(start, end, bullet.radius)):
+                if enemy.death_time == 0:
+                    self.narrow_phase_tests += 1
+                    time = segment_entry(start, end, enemy.hitbox_rect.inflate(padding, padding))
+                    if time is not None and (hit_time is None or time < hit_time):
+                        target, hit_time = enemy, time
+
+            if target:
+                self.audio.play('impact')
+                target.destroy()
+                self.score += 10
+                bullet.kill()
+            elif wall_hit:
+                bullet.kill()
+
+        if self.bullet_manager is not None:
+            hit_enemies = self.bullet_manager.collide(self.collision_grid, self.enemy_grid)
+            if hit_enemies:
+                self.audio.play('impact')
+            for enemy in hit_enemies:
+                enemy.destroy()
+                self.score += 10
 
     def handle_player_collision(self):
-        current_time = pygame.time.get_ticks()
+        current_time = get_ticks()
         if current_time - self.last_hit_time > self.player_hit_cooldown:
-            colliding_enemies = pygame.sprite.spritecollide(self.player, self.enemy_sprites, False, pygame.sprite.collide_mask)
-            active_colliding_enemies = [enemy for enemy in colliding_enemies if enemy.death_time == 0]
+            mask_rect = pygame.Rect(self.player.rect.topleft, self.player.mask.get_size())
+            active_colliding_enemies = []
+            for enemy in self.enemy_grid.query(mask_rect):
+                if enemy.death_time == 0:
+                    self.narrow_phase_tests += 1
+                    if pygame.sprite.collide_mask(self.player, enemy):
+                        active_colliding_enemies.append(enemy)
 
             if active_colliding_enemies:
                 self.player_current_health -= 10
@@ -184,46 +334,103 @@ class Game:
                     self.game_active = False
                     pygame.mouse.set_visible(True)
 
+    def update(self, dt):
+        profiler = self.profiler
+        if self.player:
+            with profiler.section('stream'):
+                self.stream_level(self.player.hitbox_rect.center)
+        with profiler.section('spawn'):
+            self.handle_enemy_spawns()
+        with profiler.section('input'):
+            self.handle_gun_cooldown()
+            self.process_input()
+        with profiler.section('update'):
+            if self.player:
+                self.flow_field.set_target(self.player.hitbox_rect.center)
+            self.all_sprites.update(dt)
+            if self.bullet_manager is not None:
+                self.bullet_manager.update(dt)
+            if self.enemy_swarm is not None:
+                self.enemy_swarm.update(dt)
+            self.rebuild_enemy_grid()
+        with profiler.section('bullet_hits'):
+            self.handle_bullet_collision()
+        with profiler.section('player_hits'):
+            self.handle_player_collision()
+        self.audio.end_frame()
+
+    def draw(self, alpha = 1.0):
+        with self.profiler.section('draw'):
+            if self.player:
+                x, y = self.all_sprites.interpolate(self.player, alpha)
+                self.all_sprites.draw((x + self.player.rect.width // 2, y + self.player.rect.height // 2), alpha)
+            else:
+                self.all_sprites.draw(pygame.Vector2(WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2))
+
+        with self.profiler.section('ui'):
+            hud = []
+            if self.player:
+                hud.append(self.ui.health_bar(self.player_current_health, self.player_max_health))
+            hud.append((self.score_text.render(self.score), (20, 20)))
+            overlay = self.profiler.hud()
+            if overlay:
+                hud.append(overlay)
+            self.all_sprites.draw_hud(hud)
+
+    def frame_counts(self):
+        return {
+            'sprites': self.all_sprites.sprite_count(),
+            'enemies': len(self.enemy_sprites),
+            'bullets': self.bullet_count(),
+            'blits': self.all_sprites.blit_count,
+            'culled': self.all_sprites.draw_stats.get('culled', 0),
+            'mask_tests': self.narrow_phase_tests,
+            'wave': self.director.wave_index + 1,
+            'budget': self.director.live_budget(),
+            'steps': self.simulation_steps,
+            'voices': self.audio.busy,
+        }
+
     def run(self):
+        use_simulation_clock(self.simulation_clock)
         while self.running:
-            dt = self.clock.tick() / 1000
+            dt = self.clock.tick(MAX_FPS if self.game_active else MENU_FPS) / 1000
 
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
                     self.running = False
-                if event.type == self.enemy_event and self.game_active:
-                    if self.enemy_frames and self.spawn_positions:
-                        Enemy(choice(self.spawn_positions), choice(list(self.enemy_frames.values())),
-                              (self.all_sprites, self.enemy_sprites), self.player, self.collision_sprites)
+                if event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                    self.profiler.toggle()
+                if event.type == pygame.WINDOWEXPOSED:
+                    self.menu.invalidate()
+                    if self.all_sprites:
+                        self.all_sprites.invalidate()
 
             if not self.game_active:
-                self.menu.draw()
-                pygame.display.update()
+                if self.level is None:
+                    self.preload()
+                pygame.display.update(self.menu.draw())
 
                 if self.menu.update():
                     self.start_game()
             else:
-                self.handle_gun_cooldown()
-                self.process_input()
-                self.all_sprites.update(dt)
-                self.handle_bullet_collision()
-                self.handle_player_collision()
-
-                self.display_surface.fill('black')
-                if self.player:
-                    self.all_sprites.draw(self.player.rect.center)
-                else:
-                    self.all_sprites.draw(pygame.Vector2(WINDOW_WIDTH / 2, WINDOW_HEIGHT / 2))
-
-                if self.player:
-                    self.ui.draw_health_bar(self.player_current_health, self.player_max_health)
-
-                score_text_surf = self.font.render(f"Score: {self.score}", True, (255, 255, 255))
-                score_text_rect = score_text_surf.get_rect(topleft=(20, 20))
-                self.display_surface.blit(score_text_surf, score_text_rect)
-
-                pygame.display.update()
-
+                self.director.record_frame(dt)
+                self.accumulator += min(dt, MAX_SIMULATION_STEPS * SIMULATION_TIMESTEP)
+                self.simulation_steps = 0
+                while self.accumulator >= SIMULATION_TIMESTEP and self.game_active:
+                    self.all_sprites.snapshot()
+                    self.simulation_clock.advance(SIMULATION_TIMESTEP * 1000)
+                    self.update(SIMULATION_TIMESTEP)
+                    self.accumulator -= SIMULATION_TIMESTEP
+                    self.simulation_steps += 1
+                if not self.game_active:
+                    continue
+                self.draw(self.accumulator / SIMULATION_TIMESTEP)
+                with self.profiler.section('display'):
+                    self.all_sprites.present()
+                self.profiler.end_frame(self.frame_counts())
+
+        self.profiler.close()
         pygame.quit()
 
 if __name__ == '__main__':
@@ -0,0 +1,151 @@
+import pygame
+from settings import *
+from collections import deque
+from contextlib import contextmanager
+import csv
+import gc
+import json
+import time
+
+class FrameProfiler:
+    def __init__(self, window = PROFILER_WINDOW, stages = PROFILER_STAGES):
+        self.window = window
+        self.stages = stages
+        self.visible = False
+        self.frame = 0
+
+        self.current = {}
+        self.history = {}
+        self.counts = {}
+        self.frame_start = time.perf_counter()
+
+        self.gc_start = None
+        self.gc_time = 0.0
+        self.gc_pauses = deque(maxlen=window)
+        gc.callbacks.append(self.on_gc)
+
+        self.trace_file = None
+        self.trace_writer = None
+
+        self.font = None
+        self.overlay = None
+        self.overlay_age = 0
+
+    def on_gc(self, phase, info):
+        if phase == 'start':
+            self.gc_start = time.perf_counter()
+        elif self.gc_start is not None:
+            self.gc_time += time.perf_counter() - self.gc_start
+            self.gc_start = None
+
+    @contextmanager
+    def section(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.current[name] = self.current.get(name, 0.0) + time.perf_counter() - start
+
+    def restart(self):
+        self.current = {}
+        self.frame_start = time.perf_counter()
+
+    def toggle(self):
+        self.visible = not self.visible
+        self.overlay = None
+
+    def open_trace(self, path):
+        self.close_trace()
+        self.trace_file = open(path, 'w', newline='')
+        self.trace_writer = None
+
+    def close_trace(self):
+        if self.trace_file:
+            self.trace_file.close()
+            self.trace_file = None
+
+    def close(self):
+        self.close_trace()
+        if self.on_gc in gc.callbacks:
+            gc.callbacks.remove(self.on_gc)
+
+    def write_trace(self, row):
+        if self.trace_file.name.endswith('.csv'):
+            if self.trace_writer is None:
+                self.trace_writer = csv.DictWriter(self.trace_file, fieldnames=list(row), extrasaction='ignore')
+                self.trace_writer.writeheader()
+            self.trace_writer.writerow(row)
+        else:
+            self.trace_file.write(json.dumps(row) + '\n')
+
+    def end_frame(self, counts = None):
+        now = time.perf_counter()
+        self.current['frame'] = now - self.frame_start
+        self.frame_start = now
+
+        for name, value in self.current.items():
+            if name not in self.history:
+                self.history[name] = deque(maxlen=self.window)
+            self.history[name].append(value * 1000)
+        self.gc_pauses.append(self.gc_time * 1000)
+        self.counts = counts or {}
+
+        if self.trace_file:
+            # Every known stage gets a column, so frames that skipped one (a
+            # render with no simulation step) still match the CSV header.
+            row = {'frame': self.frame}
+            row.update({f'{name}_ms': 0.0 for name in self.stages})
+            row.update({f'{name}_ms': round(value * 1000, 4) for name, value in self.current.items()})
+            row['gc_ms'] = round(self.gc_time * 1000, 4)
+            row.update(self.counts)
+            self.write_trace(row)
+
+        self.current = {}
+        self.gc_time = 0.0
+        self.frame += 1
+
+    def percentiles(self, name):
+        values = sorted(self.history.get(name, ()))
+        if not values:
+            return 0.0, 0.0, 0.0
+        pick = lambda fraction: values[min(len(values) - 1, int(fraction * len(values)))]
+        return pick(0.5), pick(0.95), pick(0.99)
+
+    def render_overlay(self):
+        if self.font is None:
+            self.font = pygame.font.Font(None, 22)
+
+        rows = [('stage', 'p50', 'p95', 'p99 ms')]
+        for name in self.history:
+            rows.append((name,) + tuple(f'{value:.2f}' for value in self.percentiles(name)))
+        gc_total = sum(self.gc_pauses)
+        lines = [f'gc {gc_total:.1f} ms over {len(self.gc_pauses)} frames, max {max(self.gc_pauses, default=0):.2f} ms',
+                 '  '.join(f'{name} {value}' for name, value in self.counts.items())]
+
+        line_height = self.font.get_linesize()
+        text_width = max(self.font.size(line)[0] for line in lines)
+        width = max(text_width, 320) + 16
+        height = (len(rows) + len(lines)) * line_height + 16
+        overlay = pygame.Surface((width, height), pygame.SRCALPHA)
+        overlay.fill((0, 0, 0, 170))
+
+        y = 8
+        for row in rows:
+            overlay.blit(self.font.render(row[0], True, (255, 255, 255)), (8, y))
+            for column, text in enumerate(row[1:]):
+                surf = self.font.render(text, True, (255, 255, 255))
+                overlay.blit(surf, surf.get_rect(topright=(180 + column * 60, y)))
+            y += line_height
+        for line in lines:
+            overlay.blit(self.font.render(line, True, (255, 255, 255)), (8, y))
+            y += line_height
+        return overlay
+
+    def hud(self):
+        if not self.visible:
+            return None
+        if self.overlay is None or self.overlay_age >= PROFILER_OVERLAY_REFRESH:
+            self.overlay = self.render_overlay()
+            self.overlay_age = 0
+        self.overlay_age += 1
+        return self.overlay, (20, 60)
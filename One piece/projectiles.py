@@ -0,0 +1,156 @@
+import pygame
+from timebase import get_ticks
+from spatial import cell_table, candidate_pairs
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+def segment_entries(starts, ends, boxes):
+    # Vectorised form of spatial.segment_entry over matching rows of
+    # segments and boxes: entry time along each segment, inf where it misses.
+    deltas = ends - starts
+    entry = np.zeros(len(starts))
+    leave = np.ones(len(starts))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for axis in (0, 1):
+            start, delta = starts[:, axis], deltas[:, axis]
+            low, high = boxes[:, axis], boxes[:, axis + 2]
+            near = (low - start) / delta
+            far = (high - start) / delta
+            parallel = delta == 0
+            inside = (start >= low) & (start <= high)
+            entry = np.maximum(entry, np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(near, far)))
+            leave = np.minimum(leave, np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(near, far)))
+    return np.where(entry <= leave, entry, np.inf)
+
+class BulletManager:
+    def __init__(self, images, capacity = 256, speed = 1000, lifetime = 1000):
+        self.images = images
+        self.speed = speed
+        self.lifetime = lifetime
+        self.radius = min(images.size) // 2
+        self.half_size = np.array(images.size) // 2
+        self.count = 0
+        self.walls_source = None
+        self.wall_boxes = None
+        self.wall_table = None
+
+        self.positions = np.zeros((capacity, 2))
+        self.previous = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))
+        self.spawn_times = np.zeros(capacity, dtype=np.int64)
+        self.angles = np.zeros(capacity, dtype=np.int64)
+
+    def __len__(self):
+        return self.count
+
+    def grow(self, needed):
+        capacity = len(self.positions)
+        while capacity < needed:
+            capacity *= 2
+        for name in ('positions', 'previous', 'velocities', 'spawn_times', 'angles'):
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+
+    def fire(self, pos, direction, pellets = 1, spread = 0):
+        direction = pygame.Vector2(direction)
+        if direction.magnitude() == 0:
+            direction.update(0, -1)
+        direction.normalize_ip()
+
+        if self.count + pellets > len(self.positions):
+            self.grow(self.count + pellets)
+        start = self.count
+        self.count += pellets
+        for index in range(start, self.count):
+            angle = spread * ((index - start) / (pellets - 1) - 0.5) if pellets > 1 else 0
+            pellet = direction.rotate(angle)
+            self.velocities[index] = pellet * self.speed
+            self.angles[index] = self.images.index(pellet)
+        self.positions[start:self.count] = pos
+        self.previous[start:self.count] = pos
+        self.spawn_times[start:self.count] = get_ticks()
+
+    def keep(self, alive):
+        kept = int(alive.sum())
+        if kept == self.count:
+            return
+        for array in (self.positions, self.previous, self.velocities, self.spawn_times, self.angles):
+            array[:kept] = array[:self.count][alive]
+        self.count = kept
+
+    def clear(self):
+        self.count = 0
+
+    def update(self, dt):
+        count = self.count
+        self.previous[:count] = self.positions[:count]
+        self.positions[:count] += self.velocities[:count] * dt
+        self.keep(get_ticks() - self.spawn_times[:count] < self.lifetime)
+
+    def inflated_boxes(self, rects):
+        boxes = np.array([(rect.left, rect.top, rect.right, rect.bottom) for rect in rects], dtype=float).reshape(-1, 4)
+        return boxes + (-self.radius, -self.radius, self.radius, self.radius)
+
+    def collide(self, collision_grid, enemy_grid):
+        # Returns the enemies hit this tick and removes every bullet that hit
+        # an enemy or a wall. Each bullet stops at whichever it reaches first.
+        count = self.count
+        if not count:
+            return []
+        starts, ends = self.previous[:count], self.positions[:count]
+        segments = np.concatenate((np.minimum(starts, ends), np.maximum(starts, ends)), axis=1)
+        cell_size = enemy_grid.cell_size
+
+        if self.walls_source != (collision_grid, collision_grid.version):
+            self.walls_source = (collision_grid, collision_grid.version)
+            self.wall_boxes = self.inflated_boxes(sprite.rect for sprite in collision_grid)
+            self.wall_table = cell_table(self.wall_boxes, cell_size)
+
+        wall_times = np.full(count, np.inf)
+        if len(self.wall_boxes):
+            bullets, walls = candidate_pairs(segments, self.wall_table, cell_size)
+            boxes = self.wall_boxes[walls]
+            times = segment_entries(starts[bullets], ends[bullets], boxes)
+            begin = starts[bullets]
+            started_inside = ((begin[:, 0] >= boxes[:, 0]) & (begin[:, 0] < boxes[:, 2]) &
+                              (begin[:, 1] >= boxes[:, 1]) & (begin[:, 1] < boxes[:, 3]))
+            times[started_inside] = np.inf
+            np.minimum.at(wall_times, bullets, times)
+
+        low, high = segments[:, :2].min(axis=0), segments[:, 2:].max(axis=0)
+        area = pygame.Rect(int(low[0]), int(low[1]), int(high[0] - low[0]) + 1, int(high[1] - low[1]) + 1)
+        enemies = [enemy for enemy in enemy_grid.query(area.inflate(self.radius * 2, self.radius * 2)) if enemy.death_time == 0]
+        hit_enemies = []
+        enemy_times = np.full(count, np.inf)
+        if enemies:
+            boxes = self.inflated_boxes(enemy.hitbox_rect for enemy in enemies)
+            bullets, targets = candidate_pairs(segments, cell_table(boxes, cell_size), cell_size)
+            times = segment_entries(starts[bullets], ends[bullets], boxes[targets])
+            hit = times < wall_times[bullets]
+            bullets, targets, times = bullets[hit], targets[hit], times[hit]
+            np.minimum.at(enemy_times, bullets, times)
+            first = times == enemy_times[bullets]
+            hit_enemies = [enemies[index] for index in np.unique(targets[first]).tolist()]
+
+        self.keep(np.isinf(wall_times) & np.isinf(enemy_times))
+        return hit_enemies
+
+    def draw(self, surface, camera_rect, offset, alpha = 1.0):
+        count = self.count
+        if not count:
+            return []
+        positions = self.positions[:count]
+        if alpha < 1:
+            positions = self.previous[:count] + (positions - self.previous[:count]) * alpha
+        topleft = np.round(positions).astype(int) - self.half_size
+        visible = ((topleft[:, 0] < camera_rect.right) & (topleft[:, 0] + self.half_size[0] * 2 > camera_rect.left) &
+                   (topleft[:, 1] < camera_rect.bottom) & (topleft[:, 1] + self.half_size[1] * 2 > camera_rect.top))
+
+        images = self.images.images
+        screen = topleft[visible] + (int(offset[0]), int(offset[1]))
+        return surface.blits([(images[angle], pos) for angle, pos in zip(self.angles[:count][visible].tolist(), screen.tolist())])
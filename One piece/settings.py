@@ -1,6 +1,67 @@
 import pygame
-from os.path import join
+from os.path import join, dirname, abspath
 from os import walk
 
 WINDOW_WIDTH, WINDOW_HEIGHT = 1280, 720
-TILE_SIZE = 64  
\ No newline at end of file
+TILE_SIZE = 64
+CHUNK_SIZE = 8
+
+MAP_STREAMING = False
+STREAM_RADIUS = 3
+STREAM_MEMORY_BUDGET = 64 * 1024 * 1024
+STREAM_LOADS_PER_FRAME = 4
+
+DIRTY_RECTS = False
+DIRTY_RECT_LIMIT = 256
+SCROLL_REDRAW_DISTANCE = WINDOW_WIDTH // 2
+
+ENEMY_SWARM = False
+FLOW_FIELD_RADIUS = 32
+FLOW_FIELD_CLEARANCE = TILE_SIZE // 2
+FLOW_FIELD_TIGHT_COST = 30
+SEPARATION_RADIUS = 80
+SEPARATION_WEIGHT = 1.5
+
+ENEMY_BUDGET = 150
+ENEMY_SPEED = 300
+TARGET_FRAME_TIME = 1 / 60
+SPAWN_FEEDBACK = True
+SPAWN_BUDGET_FLOOR = 0.2
+SPAWN_MARGIN = TILE_SIZE * 2
+SPAWN_WAVES = (
+    {'duration': 30000, 'interval': 300, 'batch': 1, 'enemies': ('bat', 'blob')},
+    {'duration': 30000, 'interval': 1200, 'batch': 5},
+    {'duration': 45000, 'interval': 2500, 'batch': 12},
+    {'duration': None, 'interval': 4000, 'batch': 25},
+)
+BULLET_ANGLE_STEPS = 64
+BULLET_ARRAYS = False
+BULLET_PELLETS = 1
+BULLET_SPREAD = 20
+GUN_ANGLE_STEPS = 360
+ATLAS_BATCH = 32
+
+ASSET_CACHE = True
+CACHE_DIR = join(dirname(abspath(__file__)), '.cache')
+PRELOAD_WORKERS = 4
+PRELOAD_FRAME_BUDGET = 0.004
+
+AUDIO_FREQUENCY = 44100
+AUDIO_SIZE = -16
+AUDIO_BUFFER = 512
+AUDIO_CHANNELS = 16
+MUSIC_VOLUME = 0.3
+SHOOT_VOICES = 3
+IMPACT_VOICES = 4
+
+SIMULATION_TIMESTEP = 1 / 60
+MAX_SIMULATION_STEPS = 5
+MAX_FPS = 144
+INTERPOLATION_LIMIT = TILE_SIZE
+
+PROFILER_WINDOW = 240
+PROFILER_OVERLAY_REFRESH = 15
+PROFILER_TRACE_FILE = None
+PROFILER_STAGES = ('stream', 'spawn', 'input', 'update', 'bullet_hits', 'player_hits', 'draw', 'ui', 'display')
+
+MENU_FPS = 30
@@ -0,0 +1,293 @@
+import pygame
+from settings import *
+from heapq import heappush, heappop
+from math import inf, hypot
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+CELL_KEY_SPAN = 1 << 32
+NEIGHBOURS = ((1, 0, 10), (-1, 0, 10), (0, 1, 10), (0, -1, 10), (1, 1, 14), (1, -1, 14), (-1, 1, 14), (-1, -1, 14))
+
+def cell_table(boxes, cell_size):
+    # Expands (left, top, right, bottom) boxes into one row per grid cell they
+    # touch, sorted by cell key so other boxes can be joined against it.
+    low = np.floor(boxes[:, :2] / cell_size).astype(np.int64)
+    spans = np.floor(boxes[:, 2:] / cell_size).astype(np.int64) - low + 1
+    counts = spans[:, 0] * spans[:, 1]
+    owners = np.repeat(np.arange(len(boxes)), counts)
+    local = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    keys = (low[owners, 0] + local % spans[owners, 0]) * CELL_KEY_SPAN + low[owners, 1] + local // spans[owners, 0]
+    order = np.argsort(keys, kind='stable')
+    return keys[order], owners[order]
+
+def candidate_pairs(query_boxes, table, cell_size):
+    table_keys, table_owners = table
+    query_keys, query_owners = cell_table(query_boxes, cell_size)
+    starts = np.searchsorted(table_keys, query_keys, 'left')
+    counts = np.searchsorted(table_keys, query_keys, 'right') - starts
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return np.repeat(query_owners, counts), table_owners[np.repeat(starts, counts) + offsets]
+
+def cells_for(rect, cell_size):
+    left = rect.left // cell_size
+    right = (rect.right - 1) // cell_size
+    top = rect.top // cell_size
+    bottom = (rect.bottom - 1) // cell_size
+    for cell_y in range(top, bottom + 1):
+        for cell_x in range(left, right + 1):
+            yield cell_x, cell_y
+
+def segment_rect(start, end, radius = 0):
+    left, top = min(start[0], end[0]), min(start[1], end[1])
+    rect = pygame.Rect(left, top, abs(end[0] - start[0]) + 1, abs(end[1] - start[1]) + 1)
+    return rect.inflate(radius * 2, radius * 2)
+
+def segment_entry(start, end, rect):
+    # Liang-Barsky clip: returns how far along start -> end the segment
+    # enters rect (0 if it starts inside), or None if it misses.
+    entry, leave = 0.0, 1.0
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    for step, room in ((-dx, start[0] - rect.left), (dx, rect.right - start[0]),
+                       (-dy, start[1] - rect.top), (dy, rect.bottom - start[1])):
+        if step == 0:
+            if room < 0:
+                return None
+            continue
+        time = room / step
+        if step < 0:
+            if time > leave:
+                return None
+            entry = max(entry, time)
+        else:
+            if time < entry:
+                return None
+            leave = min(leave, time)
+    return entry
+
+class CollisionGrid:
+    def __init__(self, sprites, cell_size = TILE_SIZE * 2):
+        self.cell_size = cell_size
+        self.sprites = []
+        self.indices = {}
+        self.cells = {}
+        self.version = 0
+        self.add(sprites)
+
+    def __iter__(self):
+        return (sprite for sprite in self.sprites if sprite is not None)
+
+    def __len__(self):
+        return len(self.indices)
+
+    def add(self, sprites):
+        for sprite in sprites:
+            index = len(self.sprites)
+            self.sprites.append(sprite)
+            self.indices[sprite] = index
+            for cell in cells_for(sprite.rect, self.cell_size):
+                self.cells.setdefault(cell, []).append(index)
+        self.version += 1
+
+    def remove(self, sprites):
+        # Removed slots are left empty so the remaining sprites keep their
+        # order, and the table is compacted once most of it is empty.
+        for sprite in sprites:
+            index = self.indices.pop(sprite, None)
+            if index is None:
+                continue
+            self.sprites[index] = None
+            for cell in cells_for(sprite.rect, self.cell_size):
+                self.cells[cell].remove(index)
+                if not self.cells[cell]:
+                    del self.cells[cell]
+        if len(self.indices) * 2 < len(self.sprites):
+            remaining = list(self)
+            self.sprites, self.indices, self.cells = [], {}, {}
+            self.add(remaining)
+        self.version += 1
+
+    def query(self, rect):
+        indices = set()
+        for cell in cells_for(rect, self.cell_size):
+            indices.update(self.cells.get(cell, ()))
+        return sorted(indices)
+
+    def segment_cast(self, start, end, radius = 0):
+        # Obstacles the segment starts inside are ignored so that something
+        # spawned overlapping a wall can still leave it.
+        hit = None
+        for index in self.query(segment_rect(start, end, radius)):
+            rect = self.sprites[index].rect.inflate(radius * 2, radius * 2)
+            if rect.collidepoint(start):
+                continue
+            time = segment_entry(start, end, rect)
+            if time is not None and (hit is None or time < hit[0]):
+                hit = (time, self.sprites[index])
+        return hit
+
+    def colliding(self, rect):
+        # Yields in the same order as iterating the source group. When the
+        # caller moves the rect while handling a hit, the remaining candidates
+        # are looked up again for the new position so resolution matches a
+        # full linear scan.
+        last_position = tuple(rect)
+        candidates = self.query(rect)
+        position = 0
+        while position < len(candidates):
+            index = candidates[position]
+            position += 1
+            sprite = self.sprites[index]
+            if sprite.rect.colliderect(rect):
+                yield sprite
+                if tuple(rect) != last_position:
+                    last_position = tuple(rect)
+                    candidates = [later for later in self.query(rect) if later > index]
+                    position = 0
+
+class DynamicGrid:
+    def __init__(self, cell_size = TILE_SIZE * 2):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.points = {}
+        self.sprites = []
+        self.table = None
+
+    def rebuild(self, sprites):
+        self.cells.clear()
+        self.points.clear()
+        self.table = None
+        for sprite in sprites:
+            for cell in cells_for(sprite.rect, self.cell_size):
+                self.cells.setdefault(cell, []).append(sprite)
+            x, y = sprite.rect.center
+            self.points.setdefault((x // self.cell_size, y // self.cell_size), []).append((sprite, x, y))
+
+    def rebuild_boxes(self, sprites, boxes):
+        # Array form of rebuild for the enemy swarm: boxes holds each sprite
+        # rect as a (left, top, right, bottom) row, and queries look their
+        # cells up in the sorted cell table instead of per-cell lists.
+        self.cells.clear()
+        self.points.clear()
+        self.sprites = list(sprites)
+        self.table = cell_table(boxes - (0, 0, 1, 1), self.cell_size) if len(self.sprites) else None
+
+    def query(self, rect):
+        found = {}
+        if self.table is not None:
+            keys, owners = self.table
+            wanted = np.array([x * CELL_KEY_SPAN + y for x, y in cells_for(rect, self.cell_size)], dtype=np.int64)
+            starts = np.searchsorted(keys, wanted, 'left')
+            ends = np.searchsorted(keys, wanted, 'right')
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                for owner in owners[start:end].tolist():
+                    sprite = self.sprites[owner]
+                    if sprite not in found and sprite.rect.colliderect(rect):
+                        found[sprite] = None
+            return list(found)
+        for cell in cells_for(rect, self.cell_size):
+            for sprite in self.cells.get(cell, ()):
+                if sprite not in found and sprite.rect.colliderect(rect):
+                    found[sprite] = None
+        return list(found)
+
+    def neighbour_offsets(self, sprite, radius):
+        x, y = sprite.rect.center
+        area = pygame.Rect(x - radius, y - radius, radius * 2, radius * 2)
+        radius_squared = radius * radius
+        offsets = []
+        before = True
+        for cell in cells_for(area, self.cell_size):
+            for other, other_x, other_y in self.points.get(cell, ()):
+                if other is sprite:
+                    before = False
+                    continue
+                dx, dy = x - other_x, y - other_y
+                if dx * dx + dy * dy < radius_squared:
+                    # Sprites on the same spot are split apart by their grid order.
+                    offsets.append((dx, dy) if dx or dy else (1 if before else -1, 0))
+        return offsets
+
+class FlowField:
+    def __init__(self, width, height, obstacles, radius = FLOW_FIELD_RADIUS, clearance = FLOW_FIELD_CLEARANCE):
+        self.width = width
+        self.height = height
+        self.radius = radius
+        self.clearance = clearance
+
+        self.target = None
+        self.costs = {}
+        self.directions = {}
+        self.recomputes = 0
+        self.set_obstacles(obstacles)
+
+    def set_obstacles(self, obstacles):
+        clearance = self.clearance
+        self.solid = set()
+        self.tight = set()
+        for sprite in obstacles:
+            self.solid.update(cells_for(sprite.rect, TILE_SIZE))
+            self.tight.update(cells_for(sprite.rect.inflate(clearance * 2, clearance * 2), TILE_SIZE))
+        self.tight -= self.solid
+        self.target = None
+
+    def tile_of(self, pos):
+        return int(pos[0]) // TILE_SIZE, int(pos[1]) // TILE_SIZE
+
+    def set_target(self, pos):
+        tile = self.tile_of(pos)
+        if tile != self.target:
+            self.target = tile
+            self.compute()
+
+    def cuts_corner(self, x, y, dx, dy):
+        return dx and dy and ((x + dx, y) in self.solid or (x, y + dy) in self.solid)
+
+    def compute(self):
+        target_x, target_y = self.target
+        left, right = max(0, target_x - self.radius), min(self.width - 1, target_x + self.radius)
+        top, bottom = max(0, target_y - self.radius), min(self.height - 1, target_y + self.radius)
+        solid, tight = self.solid, self.tight
+
+        costs = {self.target: 0}
+        frontier = [(0, target_x, target_y)]
+        while frontier:
+            cost, x, y = heappop(frontier)
+            if cost > costs[(x, y)]:
+                continue
+            for dx, dy, step in NEIGHBOURS:
+                tile = (x + dx, y + dy)
+                if not (left <= tile[0] <= right and top <= tile[1] <= bottom) or tile in solid:
+                    continue
+                if self.cuts_corner(x, y, dx, dy):
+                    continue
+                new_cost = cost + step + (FLOW_FIELD_TIGHT_COST if tile in tight else 0)
+                if new_cost < costs.get(tile, inf):
+                    costs[tile] = new_cost
+                    heappush(frontier, (new_cost, tile[0], tile[1]))
+
+        self.costs = costs
+        self.directions = {}
+        self.recomputes += 1
+
+    def tile_direction(self, x, y):
+        tile = (x, y)
+        if tile in self.directions:
+            return self.directions[tile]
+
+        direction = None
+        if tile != self.target:
+            best_cost = self.costs.get(tile, inf)
+            for dx, dy, _ in NEIGHBOURS:
+                cost = self.costs.get((x + dx, y + dy))
+                if cost is not None and cost < best_cost and not self.cuts_corner(x, y, dx, dy):
+                    best_cost = cost
+                    length = hypot(dx, dy)
+                    direction = (dx / length, dy / length)
+        self.directions[tile] = direction
+        return direction
+
+    def direction(self, pos):
+        return self.tile_direction(*self.tile_of(pos))
@@ -0,0 +1,237 @@
+import pygame
+from settings import *
+from timebase import get_ticks
+from Sprites import PooledSprite, get_mask, get_death_flash
+from spatial import CELL_KEY_SPAN, cell_table, candidate_pairs
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+class SwarmEnemy(PooledSprite):
+    def __init__(self, swarm, pos, frames, groups, pool = None):
+        super().__init__(pool)
+        self.animation_speed = 6
+        self.speed = ENEMY_SPEED
+        self.death_duration = 400
+
+        self.rect = pygame.Rect(0, 0, 0, 0)
+        self.hitbox_rect = pygame.Rect(0, 0, 0, 0)
+        self.slot = None
+        self.spawn(swarm, pos, frames, groups)
+
+    def spawn(self, swarm, pos, frames, groups):
+        self.swarm = swarm
+
+        self.frames = frames
+        self.image = self.frames[0]
+        self.mask = get_mask(self.image)
+
+        self.rect.size = self.image.get_size()
+        self.rect.center = pos
+        self.hitbox_rect.size = (self.rect.width - 20, self.rect.height - 40)
+        self.hitbox_rect.center = self.rect.center
+
+        self.slot = self.swarm.add(self)
+        self.add(groups)
+
+    @property
+    def death_time(self):
+        return int(self.swarm.death_times[self.slot]) if self.slot is not None else 0
+
+    def destroy(self):
+        self.swarm.death_times[self.slot] = get_ticks()
+        self.image = get_death_flash(self.frames[0])
+        self.mask = get_mask(self.frames[0])
+
+    def kill(self):
+        if self.slot is not None:
+            self.swarm.remove(self)
+        super().kill()
+
+class EnemySwarm:
+    def __init__(self, player, collision_grid, flow_field = None, capacity = 256):
+        self.player = player
+        self.flow_field = flow_field
+        self.sprites = []
+
+        self.centers = np.zeros((capacity, 2))
+        self.half_sizes = np.zeros((capacity, 2))
+        self.sizes = np.zeros((capacity, 2), dtype=np.int64)
+        self.speeds = np.zeros(capacity)
+        self.frame_indices = np.zeros(capacity)
+        self.frame_counts = np.ones(capacity)
+        self.animation_speeds = np.zeros(capacity)
+        self.death_times = np.zeros(capacity, dtype=np.int64)
+        self.death_durations = np.zeros(capacity, dtype=np.int64)
+
+        self.collision_grid = collision_grid
+        self.cell_size = TILE_SIZE * 2
+        self.obstacles_version = None
+        self.refresh_obstacles()
+
+    def refresh_obstacles(self):
+        if self.obstacles_version == self.collision_grid.version:
+            return
+        rects = [sprite.rect for sprite in self.collision_grid]
+        self.obstacles = np.array([(rect.left, rect.top, rect.right, rect.bottom) for rect in rects], dtype=float).reshape(-1, 4)
+        self.obstacle_table = cell_table(self.obstacles, self.cell_size) if len(self.obstacles) else None
+        self.obstacles_version = self.collision_grid.version
+
+    def grow(self):
+        for name in ('centers', 'half_sizes', 'sizes', 'speeds', 'frame_indices', 'frame_counts',
+                     'animation_speeds', 'death_times', 'death_durations'):
+            array = getattr(self, name)
+            grown = np.zeros((len(array) * 2,) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def add(self, enemy):
+        slot = len(self.sprites)
+        if slot == len(self.centers):
+            self.grow()
+
+        self.sprites.append(enemy)
+        self.centers[slot] = enemy.hitbox_rect.center
+        self.half_sizes[slot] = (enemy.hitbox_rect.width / 2, enemy.hitbox_rect.height / 2)
+        self.sizes[slot] = enemy.rect.size
+        self.speeds[slot] = enemy.speed
+        self.frame_indices[slot] = 0
+        self.frame_counts[slot] = len(enemy.frames)
+        self.animation_speeds[slot] = enemy.animation_speed
+        self.death_times[slot] = 0
+        self.death_durations[slot] = enemy.death_duration
+        return slot
+
+    def remove(self, enemy):
+        slot = enemy.slot
+        last = len(self.sprites) - 1
+        if slot != last:
+            moved = self.sprites[last]
+            self.sprites[slot] = moved
+            moved.slot = slot
+            for array in (self.centers, self.half_sizes, self.sizes, self.speeds, self.frame_indices, self.frame_counts,
+                          self.animation_speeds, self.death_times, self.death_durations):
+                array[slot] = array[last]
+        self.sprites.pop()
+        enemy.slot = None
+
+    def rect_boxes(self):
+        # (left, top, right, bottom) of each sprite rect, laid out the way
+        # pygame centres a rect on the integer position set in update.
+        count = len(self.sprites)
+        topleft = self.centers[:count].astype(np.int64) - self.sizes[:count] // 2
+        return np.concatenate((topleft, topleft + self.sizes[:count]), axis=1)
+
+    def resolve_walls(self, axis, step):
+        if self.obstacle_table is None:
+            return
+        centers = self.centers[:len(self.sprites)]
+        half_sizes = self.half_sizes[:len(self.sprites)]
+        moving = np.flatnonzero(step != 0)
+        if not len(moving):
+            return
+
+        boxes = np.concatenate((centers[moving] - half_sizes[moving], centers[moving] + half_sizes[moving]), axis=1)
+        movers, walls = candidate_pairs(boxes, self.obstacle_table, self.cell_size)
+        obstacles = self.obstacles[walls]
+        overlap = ((boxes[movers, 0] < obstacles[:, 2]) & (boxes[movers, 2] > obstacles[:, 0]) &
+                   (boxes[movers, 1] < obstacles[:, 3]) & (boxes[movers, 3] > obstacles[:, 1]))
+        if not overlap.any():
+            return
+
+        movers, obstacles = movers[overlap], obstacles[overlap]
+        near_edge = np.full(len(moving), np.inf)
+        far_edge = np.full(len(moving), -np.inf)
+        np.minimum.at(near_edge, movers, obstacles[:, axis])
+        np.maximum.at(far_edge, movers, obstacles[:, axis + 2])
+        hit = np.unique(movers)
+        slots = moving[hit]
+        forward = step[slots] > 0
+        centers[slots, axis] = np.where(forward, near_edge[hit] - half_sizes[slots, axis], far_edge[hit] + half_sizes[slots, axis])
+
+    def follow_flow_field(self, centers, directions, moving):
+        tiles, inverse = np.unique((centers // TILE_SIZE).astype(int), axis=0, return_inverse=True)
+        table = np.array([self.flow_field.tile_direction(x, y) or (np.nan, np.nan) for x, y in tiles.tolist()])
+        flow = table[inverse.ravel()]
+        use_flow = moving & ~np.isnan(flow[:, 0])
+        directions[use_flow] = flow[use_flow]
+
+    def separation(self, centers):
+        cells = np.floor(centers / SEPARATION_RADIUS).astype(np.int64)
+        keys = cells[:, 0] * CELL_KEY_SPAN + cells[:, 1]
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        push = np.zeros_like(centers)
+
+        for offset_x in (-1, 0, 1):
+            for offset_y in (-1, 0, 1):
+                wanted = keys + offset_x * CELL_KEY_SPAN + offset_y
+                starts = np.searchsorted(sorted_keys, wanted, 'left')
+                counts = np.searchsorted(sorted_keys, wanted, 'right') - starts
+                total = counts.sum()
+                if not total:
+                    continue
+                mine = np.repeat(np.arange(len(centers)), counts)
+                first = np.repeat(np.cumsum(counts) - counts, counts)
+                theirs = order[np.repeat(starts, counts) + np.arange(total) - first]
+
+                offsets = centers[mine] - centers[theirs]
+                distances = np.hypot(offsets[:, 0], offsets[:, 1])
+                stacked = (distances == 0) & (mine != theirs)
+                offsets[stacked, 0] = np.sign(mine[stacked] - theirs[stacked])
+                distances[stacked] = 1
+                close = (distances > 0) & (distances < SEPARATION_RADIUS)
+                mine, offsets, distances = mine[close], offsets[close], distances[close]
+                weights = (SEPARATION_RADIUS - distances) / (SEPARATION_RADIUS * distances)
+                push[:, 0] += np.bincount(mine, offsets[:, 0] * weights, len(centers))
+                push[:, 1] += np.bincount(mine, offsets[:, 1] * weights, len(centers))
+        return push
+
+    def update(self, dt):
+        self.refresh_obstacles()
+        now = get_ticks()
+        count = len(self.sprites)
+        dying = self.death_times[:count] != 0
+        expired = np.flatnonzero(dying & (now - self.death_times[:count] >= self.death_durations[:count]))
+        for slot in expired[::-1]:
+            self.sprites[slot].kill()
+
+        count = len(self.sprites)
+        if not count:
+            return
+        alive = self.death_times[:count] == 0
+        centers = self.centers[:count]
+
+        offsets = np.array(self.player.rect.center, dtype=float) - centers
+        distances = np.hypot(offsets[:, 0], offsets[:, 1])
+        moving = alive & (distances > 0)
+        directions = np.zeros_like(offsets)
+        directions[moving] = offsets[moving] / distances[moving, None]
+        if self.flow_field is not None:
+            self.follow_flow_field(centers, directions, moving)
+
+        steering = directions + self.separation(centers) * SEPARATION_WEIGHT
+        lengths = np.hypot(steering[:, 0], steering[:, 1])
+        steer = moving & (lengths > 0)
+        directions[steer] = steering[steer] / lengths[steer, None]
+        steps = directions * (self.speeds[:count] * dt)[:, None]
+
+        centers[:, 0] += steps[:, 0]
+        self.resolve_walls(0, steps[:, 0])
+        centers[:, 1] += steps[:, 1]
+        self.resolve_walls(1, steps[:, 1])
+
+        frame_indices = self.frame_indices[:count]
+        frame_indices[alive] += self.animation_speeds[:count][alive] * dt
+        frame_indices[frame_indices >= self.frame_counts[:count]] = 0
+
+        positions = centers.astype(int).tolist()
+        frames = frame_indices.astype(int).tolist()
+        for sprite, position, frame, is_alive in zip(self.sprites, positions, frames, alive.tolist()):
+            sprite.hitbox_rect.center = position
+            sprite.rect.center = position
+            if is_alive:
+                sprite.image = sprite.frames[frame]
+                sprite.mask = get_mask(sprite.image)
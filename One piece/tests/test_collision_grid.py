@@ -0,0 +1,53 @@
+import pygame
+import random
+import pytest
+from spatial import CollisionGrid
+
+class Box:
+    def __init__(self, rect):
+        self.rect = rect
+
+def random_boxes(rng, count):
+    return [Box(pygame.Rect(rng.randint(0, 800), rng.randint(0, 800), rng.randint(5, 300), rng.randint(5, 300)))
+            for _ in range(count)]
+
+def resolve(rect, candidates, axis, step):
+    # Pushes rect out of each hit the way Player.collision does, so later
+    # candidates are tested against the moved rect.
+    for box in candidates(rect):
+        if axis == 'x':
+            if step > 0: rect.right = box.rect.left
+            if step < 0: rect.left = box.rect.right
+        else:
+            if step > 0: rect.bottom = box.rect.top
+            if step < 0: rect.top = box.rect.bottom
+    return rect
+
+@pytest.mark.parametrize('seed', range(4))
+def test_colliding_matches_linear_scan(seed):
+    rng = random.Random(seed)
+    for _ in range(500):
+        boxes = random_boxes(rng, 30)
+        grid = CollisionGrid(boxes, cell_size = rng.choice((64, 128, 256)))
+        start = pygame.Rect(rng.randint(0, 900), rng.randint(0, 900), 40, 60)
+        axis, step = rng.choice('xy'), rng.choice((-1, 1))
+
+        linear = resolve(start.copy(), lambda rect: (box for box in boxes if box.rect.colliderect(rect)), axis, step)
+        assert resolve(start.copy(), grid.colliding, axis, step) == linear
+
+def test_colliding_matches_linear_scan_after_removals():
+    rng = random.Random(7)
+    boxes = random_boxes(rng, 200)
+    grid = CollisionGrid(boxes)
+    for _ in range(5):
+        removed = rng.sample(boxes, 30)
+        grid.remove(removed)
+        boxes = [box for box in boxes if box not in removed]
+        added = random_boxes(rng, 10)
+        grid.add(added)
+        boxes += added
+
+        assert sorted(map(id, grid)) == sorted(map(id, boxes))
+        for _ in range(100):
+            rect = pygame.Rect(rng.randint(0, 900), rng.randint(0, 900), 40, 60)
+            assert list(grid.colliding(rect)) == [box for box in boxes if box.rect.colliderect(rect)]
@@ -0,0 +1,42 @@
+import pygame
+import hashlib
+from main import Game
+from controls import ScriptedControls
+from timebase import SimulationClock, use_simulation_clock
+
+SCRIPT = [
+    {'frame': 0, 'keys': [], 'mouse': [900, 300], 'buttons': [1, 0, 0]},
+    {'frame': 60, 'keys': ['d']},
+    {'frame': 120, 'keys': [], 'mouse': [300, 500]},
+    {'frame': 200, 'keys': ['w', 'a'], 'buttons': [0, 0, 0]},
+    {'frame': 260, 'keys': [], 'mouse': [640, 100], 'buttons': [1, 0, 0]},
+]
+
+def frame_hashes(dirty_rects, frames = 320):
+    clock = SimulationClock()
+    use_simulation_clock(clock)
+    controls = ScriptedControls(SCRIPT)
+    game = Game(controls = controls, seed = 3)
+    game.use_dirty_rects = dirty_rects
+    game.start_game()
+
+    hashes = []
+    for frame in range(frames):
+        if not game.game_active:
+            game.start_game()
+        controls.set_frame(frame)
+        clock.advance(1000 / 60)
+        pygame.event.pump()
+        game.update(1 / 60)
+        if frame == 150:
+            game.profiler.toggle()
+        game.draw()
+        game.all_sprites.present()
+        hashes.append(hashlib.md5(pygame.image.tobytes(game.display_surface, 'RGB')).hexdigest())
+    game.profiler.close()
+    return hashes
+
+def test_dirty_rects_match_full_redraw():
+    full = frame_hashes(False)
+    dirty = frame_hashes(True)
+    assert [frame for frame, (a, b) in enumerate(zip(full, dirty)) if a != b] == []
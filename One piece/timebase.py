@@ -0,0 +1,19 @@
+import pygame
+
+class SimulationClock:
+    def __init__(self):
+        self.ticks = 0.0
+
+    def advance(self, milliseconds):
+        self.ticks += milliseconds
+
+simulation_clock = None
+
+def use_simulation_clock(clock):
+    global simulation_clock
+    simulation_clock = clock
+
+def get_ticks():
+    if simulation_clock is not None:
+        return int(simulation_clock.ticks)
+    return pygame.time.get_ticks()
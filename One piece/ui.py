@@ -1,31 +1,53 @@
 import pygame
 from settings import *
-from os.path import join
+from assets import asset_manager
+
+class CachedText:
+    def __init__(self, font, color, template = '{}'):
+        self.font = font
+        self.color = color
+        self.template = template
+        self.values = None
+        self.surf = None
+
+    def render(self, *values):
+        if values != self.values:
+            self.values = values
+            self.surf = self.font.render(self.template.format(*values), True, self.color)
+        return self.surf
 
 class Bar:
     def __init__(self, display_surface):
         self.display_surface = display_surface
+        self.health = None
+        self.surf = None
 
-    def draw_health_bar(self, current_health, max_health):
+    def health_bar(self, current_health, max_health):
         bar_width = 200
         bar_height = 20
         bar_x = WINDOW_WIDTH - bar_width - 20
         bar_y = 20
 
-        health_percentage = current_health / max_health
-        current_bar_width = bar_width * health_percentage
+        if (current_health, max_health) != self.health:
+            self.health = (current_health, max_health)
+
+            health_percentage = current_health / max_health
+            current_bar_width = bar_width * health_percentage
 
-        background_color = (50, 50, 50)
-        border_color = (200, 200, 200)
-        health_color = (255, 0, 0)
+            background_color = (50, 50, 50)
+            border_color = (200, 200, 200)
+            health_color = (255, 0, 0)
 
-        background_rect = pygame.Rect(bar_x, bar_y, bar_width, bar_height)
-        pygame.draw.rect(self.display_surface, background_color, background_rect, border_radius=5)
+            self.surf = pygame.Surface((bar_width, bar_height), pygame.SRCALPHA)
+            background_rect = pygame.Rect(0, 0, bar_width, bar_height)
+            pygame.draw.rect(self.surf, background_color, background_rect, border_radius=5)
 
-        health_rect = pygame.Rect(bar_x, bar_y, current_bar_width, bar_height)
-        pygame.draw.rect(self.display_surface, health_color, health_rect, border_radius=5)
+            health_rect = pygame.Rect(0, 0, current_bar_width, bar_height)
+            pygame.draw.rect(self.surf, health_color, health_rect, border_radius=5)
 
-        pygame.draw.rect(self.display_surface, border_color, background_rect, 3, border_radius=5)
+            pygame.draw.rect(self.surf, border_color, background_rect, 3, border_radius=5)
+
+        return self.surf, (bar_x, bar_y)
 
 class Menu:
     def __init__(self, display_surface):
@@ -53,8 +75,7 @@ class Menu:
         
         
         try:
-            self.logo = pygame.image.load(join('One piece/images/Logo/One.png')).convert_alpha()
-            self.logo = pygame.transform.scale(self.logo, (200, 200))
+            self.logo = asset_manager.image('images', 'Logo', 'One.png', size = (200, 200))
             self.logo_rect = self.logo.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT//5))  
         except:
             self.logo = None
@@ -64,62 +85,115 @@ class Menu:
         self.game_over = False
         self.final_score = 0
 
+        self.text_cache = {}
+        self.drawn = []
+        self.full_redraw = True
+        self.progress = None
+
     def set_game_over(self, score):
         self.game_over = True
         self.final_score = score
         self.instructions = "Press SPACE to Play Again"
+        self.full_redraw = True
 
     def reset(self):
         self.game_over = False
         self.instructions = "Press SPACE to Start"
+        self.full_redraw = True
 
-    def draw(self):
-        
-        self.display_surface.blit(self.background, (0, 0))
-        
-        
+    def invalidate(self):
+        self.full_redraw = True
+
+    def set_progress(self, fraction):
+        self.progress = fraction
+
+    def progress_bar(self, fraction):
+        width = int(300 * fraction)
+        key = ('progress', width)
+        if key not in self.text_cache:
+            surf = pygame.Surface((304, 14))
+            pygame.draw.rect(surf, self.controls_color, surf.get_rect(), 2)
+            surf.fill(self.title_color, (2, 2, width, 10))
+            self.text_cache[key] = surf
+        return self.text_cache[key]
+
+    def render_text(self, font, text, color):
+        key = (id(font), text, color)
+        if key not in self.text_cache:
+            self.text_cache[key] = font.render(text, True, color)
+        return self.text_cache[key]
+
+    def layout(self):
+        elements = []
         if self.logo:
-            self.display_surface.blit(self.logo, self.logo_rect)
+            elements.append((self.logo, self.logo_rect))
         
         
         current_y = self.logo_rect.bottom + 30 if self.logo else WINDOW_HEIGHT//4
         
        
-        title_surf = self.font_title.render(self.game_title, True, self.title_color)
+        title_surf = self.render_text(self.font_title, self.game_title, self.title_color)
         title_rect = title_surf.get_rect(center=(WINDOW_WIDTH//2, current_y))
-        self.display_surface.blit(title_surf, title_rect)
+        elements.append((title_surf, title_rect))
         current_y = title_rect.bottom + 10
         
         
-        menu_surf = self.font_main.render(self.menu_title, True, self.text_color)
+        menu_surf = self.render_text(self.font_main, self.menu_title, self.text_color)
         menu_rect = menu_surf.get_rect(center=(WINDOW_WIDTH//2, current_y))
-        self.display_surface.blit(menu_surf, menu_rect)
+        elements.append((menu_surf, menu_rect))
         current_y = menu_rect.bottom + 40
         
         
         if self.game_over:
             
-            game_over_surf = self.font_main.render("Game Over", True, (255, 0, 0))
+            game_over_surf = self.render_text(self.font_main, "Game Over", (255, 0, 0))
             game_over_rect = game_over_surf.get_rect(center=(WINDOW_WIDTH//2, current_y))
-            self.display_surface.blit(game_over_surf, game_over_rect)
+            elements.append((game_over_surf, game_over_rect))
             current_y = game_over_rect.bottom + 20
             
             
-            score_surf = self.font_controls.render(f"Final Score: {self.final_score}", True, self.text_color)
+            score_surf = self.render_text(self.font_controls, f"Final Score: {self.final_score}", self.text_color)
             score_rect = score_surf.get_rect(center=(WINDOW_WIDTH//2, current_y))
-            self.display_surface.blit(score_surf, score_rect)
+            elements.append((score_surf, score_rect))
             current_y = score_rect.bottom + 40
         
         
-        instr_surf = self.font_main.render(self.instructions, True, self.text_color)
+        instr_surf = self.render_text(self.font_main, self.instructions, self.text_color)
         instr_rect = instr_surf.get_rect(center=(WINDOW_WIDTH//2, current_y))
-        self.display_surface.blit(instr_surf, instr_rect)
-        current_y = instr_rect.bottom + 60
+        elements.append((instr_surf, instr_rect))
+        current_y = instr_rect.bottom + 30
+
+        if self.progress is not None:
+            bar_surf = self.progress_bar(self.progress)
+            bar_rect = bar_surf.get_rect(center=(WINDOW_WIDTH//2, current_y))
+            elements.append((bar_surf, bar_rect))
+            loading_surf = self.render_text(self.font_controls, f"Loading {int(self.progress * 100)}%", self.controls_color)
+            loading_rect = loading_surf.get_rect(center=(WINDOW_WIDTH//2, bar_rect.bottom + 20))
+            elements.append((loading_surf, loading_rect))
         
         
-        ctrl_surf = self.font_controls.render(self.controls, True, self.controls_color)
+        ctrl_surf = self.render_text(self.font_controls, self.controls, self.controls_color)
         ctrl_rect = ctrl_surf.get_rect(center=(WINDOW_WIDTH//2, WINDOW_HEIGHT - 50))
-        self.display_surface.blit(ctrl_surf, ctrl_rect)
+        elements.append((ctrl_surf, ctrl_rect))
+        return elements
+
+    def draw(self):
+        elements = self.layout()
+        if self.full_redraw:
+            self.full_redraw = False
+            dirty = [self.display_surface.get_rect()]
+        else:
+            previous = {(id(surf), tuple(rect)) for surf, rect in self.drawn}
+            current = {(id(surf), tuple(rect)) for surf, rect in elements}
+            dirty = [rect for surf, rect in self.drawn + elements if (id(surf), tuple(rect)) not in previous & current]
+        self.drawn = elements
+
+        for rect in dirty:
+            self.display_surface.blit(self.background, rect, rect)
+        for surf, rect in elements:
+            if rect.collidelist(dirty) != -1:
+                self.display_surface.blit(surf, rect)
+        return dirty
 
     def update(self):
         keys = pygame.key.get_pressed()